@@ -0,0 +1,203 @@
+# !/usr/bin/env python3
+# -*- coding:utf-8 -*-
+# @author: Shengjia Yan
+# @date: 2026-10-18 Sunday
+# @email: i@yanshengjia.com
+# Copyright @ Shengjia Yan. All Rights Reserved.
+
+
+import os
+import sys
+import json
+import codecs
+import random
+import platform
+import tracemalloc
+from time import perf_counter, strftime
+import numpy as np
+from spell import SpellChecker
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'utils'))
+from typo_maker import TypoMaker
+
+try:
+    import resource
+except ImportError:     # not on Windows
+    resource = None
+
+import logging
+logger = logging.getLogger('benchmark')
+
+
+def peak_rss_mb():
+    '''
+    peak resident set size of this process so far, None where unknown
+    '''
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / 1024.0 / 1024.0 if sys.platform == 'darwin' else peak / 1024.0
+
+
+class Benchmark:
+    '''
+    performance of every stage of the spell checker: startup (language model,
+    vocabulary and index load), detection by a new checker, detection,
+    candidate generation, candidate scoring and end-to-end check()
+
+    each stage is timed operation by operation with cold caches, then run
+    again under tracemalloc for its allocations (tracemalloc slows Python
+    down, so it never overlaps the timing). results go to a JSON file that
+    compare() can hold against a later run
+    '''
+    def __init__(self, checker_kwargs=None, essays=50, seed=0):
+        self.checker_kwargs = checker_kwargs or {}
+        self.essays = essays
+        self.seed = seed
+        self.ielts_path = '../data/testset/ielts.json'
+        self.spell_testset_paths = ['../data/testset/spell_testset1.txt', '../data/testset/spell_testset2.txt']
+        self.result_path = '../data/result/benchmark.json'
+        self.spell_checker = None
+        self.results = {}
+
+    def load_sentences(self):
+        '''
+        sentences of the bundled test set followed by synthetic essays
+        '''
+        sentences = []
+        with codecs.open(self.ielts_path, 'r', encoding='utf8', errors='ignore') as in_file:
+            for line in in_file:
+                for sentence_dict in json.loads(line)['ERRORSENTS']:
+                    sentences.append(sentence_dict['SENT'])
+        random.seed(self.seed)
+        typo_maker = TypoMaker(corpus_path=self.spell_checker.corpus_path)
+        for essay, typo_pairs in typo_maker.generate_essays(self.essays):
+            sentences.append(essay)
+        return sentences
+
+    def load_typos(self):
+        typo_list = []
+        for data_path in self.spell_testset_paths:
+            with codecs.open(data_path, 'r', encoding='utf8') as in_file:
+                for line in in_file:
+                    if ':' in line:
+                        typo_list.extend(line.split(':', 1)[1].split())
+        return typo_list
+
+    def clear_caches(self):
+        self.spell_checker.candidate_cache.clear()
+        self.spell_checker.correction_cache.clear()
+
+    def measure(self, name, operation, inputs, setup=None):
+        '''
+        run 'operation' on every input and record throughput, latency
+        percentiles, peak RSS and the allocations of one more run
+        '''
+        if setup is not None:
+            setup()
+        latencies = np.empty(len(inputs))
+        t0 = perf_counter()
+        for i, item in enumerate(inputs):
+            t1 = perf_counter()
+            operation(item)
+            latencies[i] = perf_counter() - t1
+        elapsed = perf_counter() - t0
+
+        if setup is not None:
+            setup()
+        tracemalloc.start()
+        for item in inputs:
+            operation(item)
+        allocated, allocation_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1000.0 if len(inputs) else (0.0, 0.0, 0.0)
+        result = {
+            'ops': len(inputs),
+            'seconds': elapsed,
+            'ops_per_sec': len(inputs) / elapsed if elapsed else 0.0,
+            'p50_ms': float(p50),
+            'p95_ms': float(p95),
+            'p99_ms': float(p99),
+            'peak_rss_mb': peak_rss_mb(),
+            'tracemalloc_retained_mb': allocated / 1024.0 / 1024.0,
+            'tracemalloc_peak_mb': allocation_peak / 1024.0 / 1024.0,
+        }
+        self.results[name] = result
+        logger.info('[{}] {} ops, {:.1f} ops/s, p50 {:.3f}ms, p95 {:.3f}ms, p99 {:.3f}ms, peak RSS {}MB, allocation peak {:.1f}MB'.format(
+            name, result['ops'], result['ops_per_sec'], result['p50_ms'], result['p95_ms'], result['p99_ms'],
+            '{:.1f}'.format(result['peak_rss_mb']) if result['peak_rss_mb'] is not None else '?', result['tracemalloc_peak_mb']))
+        return result
+
+    def run(self, startup_runs=3):
+        # only the last checker built is kept alive
+        checkers = [None]
+        self.measure('startup', lambda _: checkers.__setitem__(0, SpellChecker(**self.checker_kwargs).warmup()), list(range(startup_runs)))
+        spell_checker = self.spell_checker = checkers[0]
+
+        sentences = self.load_sentences()
+        # a new checker detecting typos in one sentence: loads the vocabulary only
+        self.measure('cold_detection', lambda sentence: SpellChecker(**self.checker_kwargs).detect_many(spell_checker.tokenize(sentence)),
+                     sentences[:startup_runs])
+        token_lists = [spell_checker.tokenize(sentence) for sentence in sentences]
+        typo_list = self.load_typos()
+        candidates_lists = [list(spell_checker.candidates(typo)) for typo in typo_list]
+        self.clear_caches()
+        contexts = [(candidates_list, ('of', 'the')) for candidates_list in candidates_lists if candidates_list]
+
+        self.measure('detection', spell_checker.detect_many, token_lists)
+        self.measure('candidates', spell_checker.candidates, typo_list, self.clear_caches)
+        self.measure('scoring', lambda context: spell_checker.score_context(*context), contexts)
+        self.measure('check', spell_checker.check, sentences, self.clear_caches)
+        return self.results
+
+    def report(self):
+        return {
+            'time': strftime('%Y-%m-%d %H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'checker': self.checker_kwargs,
+            'essays': self.essays,
+            'seed': self.seed,
+            'stages': self.results,
+        }
+
+    def save(self, path=None):
+        path = path or self.result_path
+        with codecs.open(path, mode='w', encoding='utf8') as result_file:
+            json.dump(self.report(), result_file, indent=2, sort_keys=True)
+        logger.info('Benchmark saved in {}'.format(path))
+
+    def compare(self, baseline_path):
+        '''
+        ops/s and p99 of this run against a saved one, ratios > 1 are faster
+        '''
+        with codecs.open(baseline_path, mode='r', encoding='utf8') as baseline_file:
+            baseline = json.load(baseline_file)['stages']
+        ratios = {}
+        for name, result in self.results.items():
+            if name not in baseline:
+                continue
+            before = baseline[name]
+            ratios[name] = {
+                'ops_per_sec': result['ops_per_sec'] / before['ops_per_sec'] if before['ops_per_sec'] else None,
+                'p99': before['p99_ms'] / result['p99_ms'] if result['p99_ms'] else None,
+            }
+            logger.info('[{}] throughput x{:.2f}, p99 x{:.2f} against {}'.format(
+                name, ratios[name]['ops_per_sec'] or 0.0, ratios[name]['p99'] or 0.0, baseline_path))
+        return ratios
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='[%(levelname)s] (%(asctime)s) (%(name)s) %(message)s')
+    benchmark = Benchmark({'lm_format': 'binary', 'candidate_engine': 'symspell'})
+    baseline_path = benchmark.result_path if os.path.exists(benchmark.result_path) else None
+    benchmark.run()
+    if baseline_path:
+        benchmark.compare(baseline_path)
+    benchmark.save()
+
+
+if __name__ == '__main__':
+    main()
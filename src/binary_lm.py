@@ -0,0 +1,362 @@
+# !/usr/bin/env python3
+# -*- coding:utf-8 -*-
+# @author: Shengjia Yan
+# @date: 2026-10-18 Sunday
+# @email: i@yanshengjia.com
+# Copyright @ Shengjia Yan. All Rights Reserved.
+
+
+import os
+import json
+import mmap
+import codecs
+import struct
+import shutil
+import tempfile
+from time import time
+
+import numpy as np
+from packed_lm import PackedLM, WORD_BITS, MAX_WORDS, MAX_CONTEXTS
+
+import logging
+logger = logging.getLogger('binary_lm')
+
+
+# file layout:
+#   header     magic, version, length of the directory
+#   directory  json, {section name: [offset, dtype, count]}
+#   sections   8 byte aligned arrays:
+#              vocab_offsets  uint64[V + 1], byte offset of every word in vocab_blob
+#              vocab_blob     uint8, utf8 words in sorted order
+#              log_p_K        float64, log_bw_K float64 and keys_K uint64 (K > 1)
+#                             for every order K, see packed_lm.PackedLM
+MAGIC = b'NGLM'
+VERSION = 2
+HEADER = struct.Struct('<4sIQ')
+
+
+def _pad(size):
+    return (size + 7) & ~7
+
+
+class StringTable:
+    '''
+    sorted sequence of utf8 strings over an offsets array and a byte blob,
+    decoded on access so it can be bisected without loading it
+    '''
+    def __init__(self, offsets, blob):
+        self.offsets = offsets
+        self.blob = blob
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        return bytes(self.blob[self.offsets[index]:self.offsets[index + 1]]).decode('utf8')
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+
+def lm_sections(packed):
+    '''
+    the named arrays stored for 'packed'
+    '''
+    encoded = [word.encode('utf8') for word in packed.vocab]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.uint64)
+    np.cumsum([len(word) for word in encoded], out=offsets[1:])
+    sections = [('vocab_offsets', offsets),
+                ('vocab_blob', np.frombuffer(b''.join(encoded), dtype=np.uint8))]
+    for k in range(packed.order):
+        sections.append(('log_p_{}'.format(k + 1), packed.log_p[k]))
+        sections.append(('log_bw_{}'.format(k + 1), packed.log_bw[k]))
+        if k > 0:
+            sections.append(('keys_{}'.format(k + 1), packed.keys[k]))
+    return sections
+
+
+def section_layout(sections, meta=None):
+    '''
+    (header bytes, {section name: [offset, dtype, count]}, total size) of
+    'sections' laid out as write_sections stores them
+    '''
+    directory = dict(meta or {})
+    offset = 0
+    for name, values in sections:
+        directory[name] = [offset, values.dtype.str, int(values.size)]
+        offset = _pad(offset + values.nbytes)
+    # shifting the offsets by the header size can lengthen the directory, so
+    # grow the header until the shifted directory fits in it
+    base = HEADER.size
+    while True:
+        shifted = dict(directory)
+        for name, _ in sections:
+            shifted[name] = [directory[name][0] + base] + directory[name][1:]
+        encoded = json.dumps(shifted).encode('utf8')
+        if HEADER.size + len(encoded) <= base:
+            break
+        base = _pad(HEADER.size + len(encoded) + 16)
+    encoded = encoded.ljust(base - HEADER.size)
+    return HEADER.pack(MAGIC, VERSION, len(encoded)) + encoded, shifted, base + offset
+
+
+def write_sections(sections, output_path, meta=None):
+    '''
+    write named numpy arrays with a json directory in front of them, 'meta'
+    holds extra scalar values for the directory
+    '''
+    header, directory, size = section_layout(sections, meta)
+    with open(output_path, 'wb') as output_file:
+        output_file.write(header)
+        position = len(header)
+        for name, values in sections:
+            output_file.write(bytes(directory[name][0] - position))
+            _write_array(output_file, values)
+            position = directory[name][0] + values.nbytes
+
+
+def _write_array(output_file, values, block=1 << 20):
+    # block by block, so file-backed (np.memmap) sections are never loaded whole
+    for start in range(0, len(values), block):
+        output_file.write(values[start:start + block].tobytes())
+
+
+def read_sections(buffer):
+    '''
+    zero-copy numpy views of the sections of a buffer written by
+    write_sections, plus the 'meta' values stored with them
+    '''
+    magic, version, length = HEADER.unpack_from(buffer)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError('not a version {} binary section file'.format(VERSION))
+    directory = json.loads(bytes(buffer[HEADER.size:HEADER.size + length]).decode('utf8'))
+    sections = {}
+    for name, entry in directory.items():
+        if isinstance(entry, list):
+            offset, dtype, count = entry
+            sections[name] = np.frombuffer(buffer, dtype=np.dtype(dtype), count=count, offset=offset)
+        else:
+            sections[name] = entry
+    return sections
+
+
+def read_lm(buffer):
+    '''
+    PackedLM over the sections of 'buffer', nothing is copied
+    '''
+    sections = read_sections(buffer)
+    vocab = StringTable(sections['vocab_offsets'], sections['vocab_blob'])
+    order = 1
+    while 'log_p_{}'.format(order + 1) in sections:
+        order += 1
+    keys = [None] + [sections['keys_{}'.format(k)] for k in range(2, order + 1)]
+    log_p = [sections['log_p_{}'.format(k)] for k in range(1, order + 1)]
+    log_bw = [sections['log_bw_{}'.format(k)] for k in range(1, order + 1)]
+    return PackedLM(vocab, keys, log_p, log_bw)
+
+
+def open_lm(lm_path):
+    '''
+    memory-map a binary language model, processes mapping the same file share
+    its pages
+    '''
+    with open(lm_path, 'rb') as lm_file:
+        buffer = mmap.mmap(lm_file.fileno(), 0, access=mmap.ACCESS_READ)
+    return read_lm(buffer)
+
+
+def compile_lm(lm, output_path):
+    '''
+    write 'lm' ({ngram: {'log_p': .., 'log_bw': ..}}, the lm.json layout) as
+    a binary language model
+    '''
+    logger.info('Compiling binary language model...')
+    t0 = time()
+    packed = PackedLM.from_dict(lm)
+    write_sections(lm_sections(packed), output_path)
+    logger.info("   {} n-grams written to {} in {:.3f}s".format(len(packed), output_path, time() - t0))
+
+
+RECORD = np.dtype([('key', '<u8'), ('log_p', '<f8'), ('log_bw', '<f8')])
+
+
+class LMWriter:
+    '''
+    incremental binary language model compiler with bounded memory
+
+    n-grams are added in ARPA order (all unigrams, then all bigrams, ...).
+    only the vocabulary is held in memory: every order is packed block by
+    block into sorted runs in a scratch directory, the runs are merged into
+    the final arrays, and the output file is assembled from them at finish().
+    n-grams whose words or prefix are missing from the lower orders cannot be
+    addressed and are skipped, which never happens in a well-formed ARPA file
+    '''
+    def __init__(self, output_path, block_size=1 << 20):
+        self.output_path = output_path
+        self.block_size = block_size
+        self.scratch = tempfile.mkdtemp(prefix='lm.', dir=os.path.dirname(os.path.abspath(output_path)))
+        self.order = 0
+        self.unigrams = {}      # word -> (log_p, log_bw)
+        self.word_id = None
+        self.vocab = None
+        self.sections = []      # (name, array), file-backed for k > 1
+        self.sections_by_name = {}
+        self.runs = []
+        self.block = []
+        self.count = 0
+        self.skipped = 0
+
+    def add(self, words, log_p, log_bw=0.0):
+        order = len(words)
+        if order != self.order:
+            if order != self.order + 1:
+                raise ValueError('{}-grams must follow the {}-grams'.format(order, order - 1))
+            self._finish_order()
+            self.order = order
+        if order == 1:
+            self.unigrams[words[0]] = (log_p, log_bw)
+            return
+        ids = [self.word_id.get(word, -1) for word in words]
+        if min(ids) < 0:
+            self.skipped += 1
+            return
+        self.block.append((ids, log_p, log_bw))
+        if len(self.block) >= self.block_size:
+            self._flush_block()
+
+    def _path(self, name):
+        return os.path.join(self.scratch, name)
+
+    def _flush_block(self):
+        '''
+        pack the pending block into keys and save it as a sorted run
+        '''
+        if not self.block:
+            return
+        k = self.order - 1
+        ids = np.array([entry[0] for entry in self.block], dtype=np.int64)
+        records = np.empty(len(self.block), dtype=RECORD)
+        records['log_p'] = [entry[1] for entry in self.block]
+        records['log_bw'] = [entry[2] for entry in self.block]
+        self.block = []
+
+        index = ids[:, 0]
+        valid = np.ones(len(ids), dtype=bool)
+        for j in range(1, k):
+            keys = self.sections_by_name['keys_{}'.format(j + 1)]
+            packed = (index.astype(np.uint64) << np.uint64(WORD_BITS)) | ids[:, j].astype(np.uint64)
+            index = np.searchsorted(keys, packed).clip(max=max(len(keys) - 1, 0))
+            valid &= (len(keys) > 0) & (keys[index] == packed)
+        self.skipped += int(len(ids) - np.count_nonzero(valid))
+        records = records[valid]
+        records['key'] = (index[valid].astype(np.uint64) << np.uint64(WORD_BITS)) | ids[valid, k].astype(np.uint64)
+        records.sort(order='key', kind='stable')
+
+        path = self._path('run.{}'.format(len(self.runs)))
+        records.tofile(path)
+        self.runs.append((path, len(records)))
+
+    def _merge_runs(self):
+        '''
+        merge the sorted runs of the current order into its final arrays
+        '''
+        order = self.order
+        outputs = dict((name, open(self._path('{}_{}'.format(name, order)), 'wb'))
+                       for name in ('keys', 'log_p', 'log_bw'))
+        runs = [np.memmap(path, dtype=RECORD, mode='r', shape=(count,)) for path, count in self.runs if count]
+        positions = [0] * len(runs)
+        block = max(self.block_size // max(len(runs), 1), 1024)
+        pending = np.empty(0, dtype=RECORD)
+        total = 0
+        while True:
+            taken = [pending]
+            cutoff = None
+            for r, run in enumerate(runs):
+                if positions[r] < len(run):
+                    chunk = np.array(run[positions[r]:positions[r] + block])
+                    positions[r] += len(chunk)
+                    taken.append(chunk)
+                    if positions[r] < len(run):
+                        last = chunk['key'][-1]
+                        cutoff = last if cutoff is None else min(cutoff, last)
+            pending = np.concatenate(taken)
+            pending.sort(order='key', kind='stable')
+            if cutoff is None:
+                ready, pending = pending, pending[:0]
+            else:
+                split = np.searchsorted(pending['key'], cutoff, side='right')
+                ready, pending = pending[:split], pending[split:]
+            if len(ready):
+                if total + len(ready) > MAX_CONTEXTS:
+                    raise ValueError('too many {}-grams to pack'.format(order))
+                outputs['keys'].write(np.ascontiguousarray(ready['key']).tobytes())
+                outputs['log_p'].write(np.ascontiguousarray(ready['log_p']).tobytes())
+                outputs['log_bw'].write(np.ascontiguousarray(ready['log_bw']).tobytes())
+                total += len(ready)
+            if cutoff is None and not len(pending):
+                break
+        for output in outputs.values():
+            output.close()
+        del runs
+        for path, _ in self.runs:
+            os.remove(path)
+        self.runs = []
+        return total
+
+    def _finish_order(self):
+        if self.order == 1:
+            self.vocab = sorted(self.unigrams)
+            if len(self.vocab) > MAX_WORDS:
+                raise ValueError('vocabulary exceeds {} words'.format(MAX_WORDS))
+            self.word_id = dict((word, i) for i, word in enumerate(self.vocab))
+            encoded = [word.encode('utf8') for word in self.vocab]
+            offsets = np.zeros(len(encoded) + 1, dtype=np.uint64)
+            np.cumsum([len(word) for word in encoded], out=offsets[1:])
+            self.sections = [('vocab_offsets', offsets),
+                             ('vocab_blob', np.frombuffer(b''.join(encoded), dtype=np.uint8)),
+                             ('log_p_1', np.array([self.unigrams[w][0] for w in self.vocab], dtype=np.float64)),
+                             ('log_bw_1', np.array([self.unigrams[w][1] for w in self.vocab], dtype=np.float64))]
+            self.count += len(self.vocab)
+            self.unigrams = None
+        elif self.order > 1:
+            self._flush_block()
+            total = self._merge_runs()
+            order = self.order
+            for name, dtype in (('log_p', np.float64), ('log_bw', np.float64), ('keys', np.uint64)):
+                path = self._path('{}_{}'.format(name, order))
+                values = np.memmap(path, dtype=dtype, mode='r', shape=(total,)) if total else np.zeros(0, dtype=dtype)
+                self.sections.append(('{}_{}'.format(name, order), values))
+            self.count += total
+        self.sections_by_name = dict(self.sections)
+
+    def finish(self):
+        '''
+        write the output file and remove the scratch directory, returns the
+        number of n-grams written
+        '''
+        self._finish_order()
+        try:
+            write_sections(self.sections, self.output_path)
+        finally:
+            self.sections = []
+            self.sections_by_name = {}
+            shutil.rmtree(self.scratch, ignore_errors=True)
+        if self.skipped:
+            logger.warning('{} n-grams without their words or prefix in the lower orders skipped'.format(self.skipped))
+        return self.count
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='[%(levelname)s] (%(asctime)s) (%(name)s) %(message)s')
+    json_path = '../data/lm/lm.json'
+    output_path = '../data/lm/lm.bin'
+    with codecs.open(json_path, mode='r', encoding='utf8') as lm_json:
+        lm = json.load(lm_json)
+    compile_lm(lm, output_path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+# !/usr/bin/env python3
+# -*- coding:utf-8 -*-
+# @author: Shengjia Yan
+# @date: 2026-10-18 Sunday
+# @email: i@yanshengjia.com
+# Copyright @ Shengjia Yan. All Rights Reserved.
+
+
+from collections import OrderedDict
+
+
+CACHE_POLICIES = ('lru', 'fifo')
+
+
+class LRUCache:
+    '''
+    bounded mapping that evicts the least recently used entry ('lru') or the
+    oldest inserted one ('fifo') when full, and counts hits, misses and
+    evictions; maxsize 0 disables it
+    '''
+    def __init__(self, maxsize=10000, policy='lru'):
+        if policy not in CACHE_POLICIES:
+            raise ValueError('unknown cache policy: {}'.format(policy))
+        self.maxsize = maxsize
+        self.policy = policy
+        self._data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        try:
+            value = self._data[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        if self.policy == 'lru':
+            self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        if self.maxsize <= 0:
+            return
+        if key in self._data:
+            self._data[key] = value
+            if self.policy == 'lru':
+                self._data.move_to_end(key)
+            return
+        self._data[key] = value
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def items(self):
+        '''
+        (key, value) pairs, the next one to be evicted first
+        '''
+        return list(self._data.items())
+
+    def clear(self):
+        self._data.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'policy': self.policy,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': float(self.hits) / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,91 @@
+# !/usr/bin/env python3
+# -*- coding:utf-8 -*-
+# @author: Shengjia Yan
+# @date: 2026-10-18 Sunday
+# @email: i@yanshengjia.com
+# Copyright @ Shengjia Yan. All Rights Reserved.
+
+
+import heapq
+from operator import itemgetter
+
+
+class BeamDecoder:
+    '''
+    joint correction of all the typos of a sentence
+
+    the sentence is a lattice: a typo position holds its candidates, any
+    other position its own token. hypotheses are scored with the language
+    model left to right, those ending in the same n-gram history are merged
+    (only the best one can win from there, as in Viterbi) and at most
+    'beam_width' survive each position. a typo keeps its 'max_candidates'
+    best candidates given its uncorrected left context, so the work per
+    sentence is bounded by beam_width * max_candidates language model
+    lookups per typo plus beam_width per token following a typo, until all
+    hypotheses share their history again
+    '''
+    def __init__(self, spell_checker, beam_width=8, max_candidates=20):
+        if beam_width < 1:
+            raise ValueError('beam width must be at least 1')
+        self.spell_checker = spell_checker
+        self.beam_width = beam_width
+        self.max_candidates = max_candidates
+
+    def lattice(self, tokens, typo_indices):
+        '''
+        {index: (words, ids, costs)} for every typo: the words reported as
+        its correction, the ids the language model sees for them and their
+        channel costs (see SpellChecker.channel_costs)
+        '''
+        spell_checker = self.spell_checker
+        lm = spell_checker.lm
+        history = max(lm.order - 1, 0)
+        options = {}
+        for index in typo_indices:
+            left = tokens[max(index - history, 0):index]
+            correction, rank_list = spell_checker.correct_context(tokens[index], left, (), self.max_candidates)
+            if rank_list:
+                options[index] = (rank_list, [lm.word_id(word) for word in rank_list],
+                                  spell_checker.channel_costs(tokens[index], rank_list))
+            else:
+                # no candidate: reported as <unk>, the typo stays in the history
+                options[index] = ([correction], [lm.word_id(tokens[index])], [0.0])
+        return options
+
+    def decode(self, tokens, typo_indices):
+        '''
+        {index: correction} of the most probable sentence
+        '''
+        if not typo_indices:
+            return {}
+        lm = self.spell_checker.lm
+        size = max(lm.order - 1, 0)
+        options = self.lattice(tokens, typo_indices)
+        last = max(typo_indices)
+
+        beam = [(0.0, (), ())]     # (log10 score, history ids, chosen words)
+        for index, token in enumerate(tokens):
+            if index > last and len(beam) == 1:
+                break
+            words, ids, costs = options.get(index, (None, [lm.word_id(token)], [0.0]))
+            if words is None and len(beam) == 1:
+                # nothing to rank yet, the score of a lone hypothesis is not needed
+                score, history, chosen = beam[0]
+                beam = [(score, (history + (ids[0],))[-size:] if size else (), chosen)]
+                continue
+
+            best = {}       # history -> hypothesis, recombination
+            for score, history, chosen in beam:
+                # LRU-cached in the model, hypotheses sharing a history walk it once
+                scores = lm.score_batch(lm.context_state(history), ids)
+                for position, word_id in enumerate(ids):
+                    next_history = (history + (word_id,))[-size:] if size else ()
+                    next_score = score + float(scores[position]) - float(costs[position])
+                    kept = best.get(next_history)
+                    if kept is None or next_score > kept[0]:
+                        best[next_history] = (next_score, next_history,
+                                              chosen + (words[position],) if words is not None else chosen)
+            beam = heapq.nlargest(self.beam_width, best.values(), key=itemgetter(0))
+
+        chosen = beam[0][2]
+        return dict(zip(sorted(typo_indices), chosen))
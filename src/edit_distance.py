@@ -0,0 +1,88 @@
+# !/usr/bin/env python3
+# -*- coding:utf-8 -*-
+# @author: Shengjia Yan
+# @date: 2026-10-18 Sunday
+# @email: i@yanshengjia.com
+# Copyright @ Shengjia Yan. All Rights Reserved.
+
+
+LETTERS = 'abcdefghijklmnopqrstuvwxyz'
+
+# cost of introducing a character that SpellChecker.edits1 can never insert or
+# substitute, large enough to exceed any distance we care about
+FORBIDDEN = 1 << 20
+
+
+def insert_cost(char):
+    '''
+    cost of inserting (or substituting in) 'char' on the target side
+    '''
+    return 1 if char in LETTERS else FORBIDDEN
+
+
+def damerau_levenshtein(source, target, max_distance=None):
+    '''
+    unrestricted Damerau-Levenshtein distance from 'source' to 'target'
+    (Lowrance-Wagner), i.e. the minimal number of deletes, transposes, replaces
+    and inserts, where replaces and inserts may only introduce lowercase
+    letters, exactly the edit space spanned by SpellChecker.edits1
+
+    two overlapping transposes (rotating three adjacent characters) also count
+    as two edits, which only matters when the rotated character is one that
+    edits1 could not delete and re-insert
+
+    returns max_distance + 1 as soon as the distance is proven to exceed
+    'max_distance'
+    '''
+    n, m = len(source), len(target)
+    limit = n + m + FORBIDDEN if max_distance is None else max_distance
+    if abs(n - m) > limit:
+        return limit + 1
+
+    # prefix[j]: cost of inserting target[:j]
+    prefix = [0] * (m + 1)
+    for j in range(m):
+        prefix[j + 1] = prefix[j] + insert_cost(target[j])
+
+    inf = n + prefix[m] + 1
+    table = [[inf] * (m + 2) for _ in range(n + 2)]
+    for i in range(n + 1):
+        table[i + 1][1] = i
+    for j in range(m + 1):
+        table[1][j + 1] = prefix[j]
+
+    last_row = {}   # char -> last row of 'source' where it occurred
+    for i in range(1, n + 1):
+        char = source[i - 1]
+        last_col = 0
+        row_min = inf
+        prev_row = table[i]
+        row = table[i + 1]
+        for j in range(1, m + 1):
+            target_char = target[j - 1]
+            i1 = last_row.get(target_char, 0)
+            j1 = last_col
+            if char == target_char:
+                cost = 0
+                last_col = j
+            else:
+                cost = insert_cost(target_char)
+            value = min(prev_row[j] + cost,
+                        row[j] + insert_cost(target_char),
+                        prev_row[j + 1] + 1,
+                        table[i1][j1] + (i - i1 - 1) + 1 + prefix[j - 1] - prefix[j1])
+            if i > 2 and j > 2 and value > table[i - 2][j - 2] + 2:
+                rotated = source[i - 3:i]
+                window = target[j - 3:j]
+                if window == rotated[1:] + rotated[0] or window == rotated[2] + rotated[:2]:
+                    value = table[i - 2][j - 2] + 2
+            row[j + 1] = value
+            if value < row_min:
+                row_min = value
+        if row[1] < row_min:
+            row_min = row[1]
+        if row_min > limit:
+            return limit + 1
+        last_row[char] = i
+
+    return min(table[n + 1][m + 1], limit + 1)
@@ -0,0 +1,257 @@
+# !/usr/bin/env python3
+# -*- coding:utf-8 -*-
+# @author: Shengjia Yan
+# @date: 2026-10-18 Sunday
+# @email: i@yanshengjia.com
+# Copyright @ Shengjia Yan. All Rights Reserved.
+
+
+import math
+import heapq
+import codecs
+from collections import Counter
+
+
+KEYBOARD_ROWS = ('qwertyuiop', 'asdfghjkl', 'zxcvbnm')
+
+
+def keyboard_neighbours():
+    '''
+    {letter: set of the letters next to it on a QWERTY keyboard}
+    '''
+    position = {}
+    for row, keys in enumerate(KEYBOARD_ROWS):
+        for column, key in enumerate(keys):
+            # each row is shifted by half a key from the one above
+            position[key] = (row, column + row * 0.5)
+    neighbours = dict((key, set()) for key in position)
+    for a, (row_a, column_a) in position.items():
+        for b, (row_b, column_b) in position.items():
+            if a != b and abs(row_a - row_b) <= 1 and abs(column_a - column_b) <= 1:
+                neighbours[a].add(b)
+    return neighbours
+
+
+def align(correct, typo):
+    '''
+    edit operations of a cheapest unit-cost alignment (optimal string
+    alignment: adjacent transpositions, no edit inside a transposed pair)
+    turning 'correct' into 'typo':
+        ('sub', x, y)    x typed as y
+        ('del', x, '')   x left out
+        ('ins', '', y)   y typed in excess
+        ('trans', x, y)  xy typed as yx
+    '''
+    rows, columns = len(correct), len(typo)
+    table = [[0] * (columns + 1) for _ in range(rows + 1)]
+    for i in range(rows + 1):
+        table[i][0] = i
+    for j in range(columns + 1):
+        table[0][j] = j
+    for i in range(1, rows + 1):
+        for j in range(1, columns + 1):
+            cost = 0 if correct[i - 1] == typo[j - 1] else 1
+            table[i][j] = min(table[i - 1][j - 1] + cost, table[i - 1][j] + 1, table[i][j - 1] + 1)
+            if i > 1 and j > 1 and correct[i - 1] == typo[j - 2] and correct[i - 2] == typo[j - 1] \
+                    and correct[i - 1] != correct[i - 2]:
+                table[i][j] = min(table[i][j], table[i - 2][j - 2] + 1)
+
+    operations = []
+    i, j = rows, columns
+    while i > 0 or j > 0:
+        if i > 1 and j > 1 and correct[i - 1] == typo[j - 2] and correct[i - 2] == typo[j - 1] \
+                and correct[i - 1] != correct[i - 2] and table[i][j] == table[i - 2][j - 2] + 1:
+            operations.append(('trans', correct[i - 2], correct[i - 1]))
+            i, j = i - 2, j - 2
+        elif i > 0 and j > 0 and table[i][j] == table[i - 1][j - 1] + (correct[i - 1] != typo[j - 1]):
+            if correct[i - 1] != typo[j - 1]:
+                operations.append(('sub', correct[i - 1], typo[j - 1]))
+            i, j = i - 1, j - 1
+        elif i > 0 and table[i][j] == table[i - 1][j] + 1:
+            operations.append(('del', correct[i - 1], ''))
+            i -= 1
+        else:
+            operations.append(('ins', '', typo[j - 1]))
+            j -= 1
+    operations.reverse()
+    return operations
+
+
+class ErrorModel:
+    '''
+    noisy channel P(typo | word) from confusion counts of substitutions,
+    deletions, insertions and transpositions, learned from (word, typo)
+    pairs and smoothed towards keyboard neighbours
+
+    an edit costs -log10 of its probability and a word / typo pair the cost
+    of its cheapest alignment, so costs add up like log probabilities of the
+    language model. a character typed right costs nothing: only the ranking
+    of the candidates of one typo matters
+    '''
+    def __init__(self, smoothing=0.5, adjacent_weight=8.0, edit_penalty=2.0):
+        self.smoothing = smoothing
+        self.adjacent_weight = adjacent_weight
+        self.edit_penalty = edit_penalty
+        self.neighbours = keyboard_neighbours()
+        self.counts = Counter()         # (operation, x, y) -> count
+        self.chars = Counter()          # character of the correct words -> count
+        self.pairs = Counter()          # adjacent characters of the correct words -> count
+        self.costs = {}
+        self.pair_number = 0
+
+    @classmethod
+    def from_testsets(cls, paths, **kwargs):
+        '''
+        learn from spell_testset files: 'word: typo1 typo2 ...' per line
+        '''
+        pairs = []
+        for path in paths:
+            with codecs.open(path, mode='r', encoding='utf8') as in_file:
+                for line in in_file:
+                    if ':' not in line:
+                        continue
+                    word, typos = line.split(':', 1)
+                    pairs.extend((word.strip(), typo) for typo in typos.split())
+        error_model = cls(**kwargs)
+        error_model.learn(pairs)
+        return error_model
+
+    def learn(self, pairs):
+        for correct, typo in pairs:
+            self.pair_number += 1
+            self.chars.update(correct)
+            self.pairs.update(zip(correct, correct[1:]))
+            self.counts.update(align(correct, typo))
+        self.costs = {}
+
+    def _cost(self, operation, x, y):
+        # unseen characters count as average ones
+        average_chars = float(sum(self.chars.values())) / max(len(self.chars), 1) or 1.0
+        prior = self.smoothing
+        if operation == 'sub':
+            if y in self.neighbours.get(x, ()):
+                prior *= self.adjacent_weight
+            total = self.chars[x] or average_chars
+        elif operation == 'del':
+            total = self.chars[x] or average_chars
+        elif operation == 'ins':
+            total = average_chars
+        else:
+            total = self.pairs[(x, y)] or average_chars
+        return self.edit_penalty - math.log10((self.counts[(operation, x, y)] + prior) / (total + 1.0))
+
+    def cost(self, operation, x='', y=''):
+        key = (operation, x, y)
+        cost = self.costs.get(key)
+        if cost is None:
+            cost = self.costs[key] = self._cost(operation, x, y)
+        return cost
+
+    def distance(self, word, typo):
+        '''
+        cost of the cheapest alignment of 'word' with 'typo', -log10 P(typo | word)
+        '''
+        cost = self.cost
+        columns = len(typo)
+        previous = None
+        row = [0.0]
+        for j in range(columns):
+            row.append(row[j] + cost('ins', '', typo[j]))
+        for i, char in enumerate(word):
+            next_row = [row[0] + cost('del', char)]
+            for j in range(columns):
+                best = row[j] + (0.0 if char == typo[j] else cost('sub', char, typo[j]))
+                best = min(best, row[j + 1] + cost('del', char), next_row[j] + cost('ins', '', typo[j]))
+                if previous is not None and j > 0 and char == typo[j - 1] and word[i - 1] == typo[j] and char != word[i - 1]:
+                    best = min(best, previous[j - 1] + cost('trans', word[i - 1], char))
+                next_row.append(best)
+            previous, row = row, next_row
+        return row[-1]
+
+
+class ChannelIndex:
+    '''
+    character trie over the dictionary searched with the weighted alignment
+    of an ErrorModel
+
+    as in TrieIndex, alignments that drift more than 'max_distance'
+    characters away from the diagonal are not considered and a branch is
+    abandoned as soon as every cell of its last two rows (a transposition
+    reaches two rows back) costs more than the bound. the bound starts at
+    max_cost and tightens to the k-th cheapest word found so far, so the
+    branches of unlikely edits are never expanded
+    '''
+    def __init__(self, words, error_model, k=10, max_cost=None):
+        self.error_model = error_model
+        self.k = k
+        # default bound: two substitutions never seen in the training pairs
+        self.max_cost = max_cost if max_cost is not None else 2 * error_model.cost('sub', '', '')
+        self.root = {}
+        for word in words:
+            node = self.root
+            for char in word:
+                node = node.setdefault(char, {})
+            node[None] = word
+
+    def search(self, typo, max_distance=2):
+        '''
+        the k most likely words for 'typo' as {word: cost}
+        '''
+        cost = self.error_model.cost
+        inf = float('inf')
+        columns = len(typo)
+        insert = [cost('ins', '', char) for char in typo]
+        first = [0.0]
+        for j in range(columns):
+            first.append(first[-1] + insert[j] if j < max_distance else inf)
+        char_costs = {}     # path character -> (deletion cost, cost of aligning it with each typo character)
+        best = []           # max-heap of (-cost, word), the k cheapest
+        bound = [self.max_cost]
+
+        def descend(node, char, depth, row, previous, previous_char, previous_lowest):
+            costs = char_costs.get(char)
+            if costs is None:
+                costs = char_costs[char] = (cost('del', char), [0.0 if char == typed else cost('sub', char, typed) for typed in typo])
+            delete, substitute = costs
+            if depth > columns + max_distance:
+                return
+            next_row = [inf] * (columns + 1)
+            low = depth - max_distance - 1
+            if low < 0:
+                low = 0
+                next_row[0] = row[0] + delete
+            value = next_row[low]
+            lowest = value
+            for j in range(low, min(columns, depth + max_distance)):
+                diagonal = row[j] + substitute[j]
+                up = row[j + 1] + delete
+                left = value + insert[j]
+                value = diagonal if diagonal < up else up
+                if left < value:
+                    value = left
+                if previous is not None and j > 0 and char == typo[j - 1] and previous_char == typo[j] \
+                        and char != previous_char:
+                    transposed = previous[j - 1] + cost('trans', previous_char, char)
+                    if transposed < value:
+                        value = transposed
+                next_row[j + 1] = value
+                if value < lowest:
+                    lowest = value
+            if lowest > bound[0] and previous_lowest > bound[0]:
+                return
+            word = node.get(None)
+            if word is not None and next_row[columns] <= bound[0]:
+                if len(best) < self.k:
+                    heapq.heappush(best, (-next_row[columns], word))
+                elif next_row[columns] < -best[0][0]:
+                    heapq.heapreplace(best, (-next_row[columns], word))
+                if len(best) == self.k:
+                    bound[0] = min(bound[0], -best[0][0])
+            for child_char, child in node.items():
+                if child_char is not None:
+                    descend(child, child_char, depth + 1, next_row, row, char, lowest)
+
+        for char, child in self.root.items():
+            if char is not None:
+                descend(child, char, 1, first, None, '', 0.0)
+        return dict((word, -negative) for negative, word in best)
@@ -6,21 +6,17 @@
 # Copyright @ Shengjia Yan. All Rights Reserved.
 
 
+import os
 import re
 import json
 import codecs
+import itertools
+import tracemalloc
 from time import time
-from collections import Counter
+from collections import Counter, deque
 from spell import *
 
 import logging
-logging.basicConfig(
-        level=logging.INFO,
-        format='[%(levelname)s] (%(asctime)s) (%(name)s) %(message)s',
-        handlers=[
-            logging.FileHandler('../data/log/spell.log', encoding='utf8'),
-            logging.StreamHandler()
-        ])
 logger = logging.getLogger('evaluator')
 
 
@@ -29,95 +25,370 @@ class Evaluator:
         self.spell_checker = SpellChecker()
         self.ielts_path = '../data/testset/ielts.json'
         self.result_path = '../data/result/result.json'
-        self.test_set = self._load_dataset(self.ielts_path)
-        self.result = []
+        self.run_path = '../data/result/result.run.json'     # what produced result.json, see evaluate
+        self.spell_testset_paths = ['../data/testset/spell_testset1.txt', '../data/testset/spell_testset2.txt']
+        self._test_set = None
+        self.report_every = 1000
+
+    @property
+    def test_set(self):
+        '''
+        the whole test set in memory, for the speed tests; evaluate() streams it
+        '''
+        if self._test_set is None:
+            self._test_set = self._load_dataset(self.ielts_path)
+        return self._test_set
 
     def _load_dataset(self, data_path):
+        return list(self._iter_dataset(data_path))
+
+    def _iter_dataset(self, data_path, skip=0):
         with codecs.open(data_path, 'r', encoding='utf8', errors='ignore') as in_file:
-            data_set = []
-            for line in in_file:
+            for line in itertools.islice(in_file, skip, None):
                 line = line.strip()
                 line_dict = json.loads(line)
-                data_set.append(line_dict)
-        return data_set
-      
-    def evaluate(self, save=True):
-        self.ielts_typo_counter = 0
-        self.detected_typo_counter = 0
-        self.corrected_typo_counter = 0
-        self.recall = 0.0
-        self.precision = 0.0
-        self.f1_score = 0.0
-
-        case_num = 0
-        for case in self.test_set:
-            print(case_num)
-            error_sentences = case['ERRORSENTS']
-            for sentence_dict in error_sentences:
-                sentence  = sentence_dict['SENT']
-                typo_list = self.spell_checker.check(sentence)
-                errors    = sentence_dict['ERRORS']
-                for error in errors:
-                    error['detected'] = 'False'
-                    error['corrected'] = 'False'
-                    if error['type'] == 'SPL':
-                        self.ielts_typo_counter += 1
-                        for typo_dict in typo_list:
-                            if int(error['start']) == typo_dict['start']:
-                                error['detected'] = 'True'
-                                self.detected_typo_counter += 1
-                                if error['answer'].lower() == typo_dict['correction']:
-                                    error['corrected'] = 'True'
-                                    self.corrected_typo_counter += 1
-                                break
-            self.result.append(case)
-            case_num += 1
-        
-        self.recall = float(self.detected_typo_counter) / self.ielts_typo_counter
-        self.precision = float(self.corrected_typo_counter) / self.detected_typo_counter
-        self.f1_score = (2 * self.precision * self.recall) / (self.recall + self.precision)
+                yield line_dict
+
+    def evaluate(self, save=True, processes=None, chunk_size=16, resume=False):
+        '''
+        check the test set case by case as it is read from disk, on
+        'processes' worker processes (see SpellChecker.check_stream), and
+        append every annotated case to the result file as soon as it is done
+
+        with 'resume', the cases already in the result file are counted back
+        in and skipped, so a run that was interrupted carries on where it
+        stopped instead of starting over. only a run of the same checker on
+        the same test set that did not complete is resumed (see run_path),
+        anything else starts over
+        '''
+        counter = Counter()
+        done = 0
+        run = self._run_identity()
+        if save and resume:
+            if self._resumable(run):
+                done = self._load_results(counter)
+            if done:
+                logger.info('Resuming after {} cases of {}'.format(done, self.result_path))
+        if save and not done:
+            self._save_run(run, complete=False)
+
+        cases = self._iter_dataset(self.ielts_path, skip=done)
+        result_file = codecs.open(self.result_path, 'a' if done else 'w', encoding='utf8') if save else None
+        t0 = time()
+        try:
+            for case_num, (case, typo_lists) in enumerate(self._check_cases(cases, processes, chunk_size), done + 1):
+                counter.update(self._score_case(case, typo_lists))
+                if result_file is not None:
+                    result_file.write(json.dumps(case) + '\n')
+                if case_num % self.report_every == 0:
+                    if result_file is not None:
+                        result_file.flush()
+                    logger.info('{} cases evaluated ({:.1f} cases/s)'.format(case_num, (case_num - done) / (time() - t0)))
+        finally:
+            if result_file is not None:
+                result_file.close()
+        if save:
+            self._save_run(run, complete=True)
+
+        self.ielts_typo_counter = counter['typos']
+        self.detected_typo_counter = counter['detected']
+        self.corrected_typo_counter = counter['corrected']
+        self.recall = float(self.detected_typo_counter) / self.ielts_typo_counter if self.ielts_typo_counter else 0.0
+        self.precision = float(self.corrected_typo_counter) / self.detected_typo_counter if self.detected_typo_counter else 0.0
+        self.f1_score = (2 * self.precision * self.recall) / (self.recall + self.precision) if self.recall + self.precision else 0.0
         logger.info('IELTS typo quantity: {}'.format(self.ielts_typo_counter))
         logger.info('Detected typo quantity: {}'.format(self.detected_typo_counter))
         logger.info('Corrected typo quantity: {}'.format(self.corrected_typo_counter))
         logger.info('RECALL: {:.3f}, PRECISION: {:.3f}, F1: {:.3f}'.format(self.recall, self.precision, self.f1_score))
-
         if save:
-            self._save_result()
-
-    def _save_result(self):
-        with open(self.result_path, 'w') as result_file:
-            for res in self.result:
-                res_json = json.dumps(res)
-                result_file.write(res_json + '\n')
             logger.info('Result saved in {}'.format(self.result_path))
 
+    def _check_cases(self, cases, processes, chunk_size):
+        '''
+        (case, typo list of each of its sentences) for every case, in order,
+        with all the sentences checked as one stream
+        '''
+        pending = deque()   # cases whose sentences were handed out, oldest first
+
+        def sentences():
+            for case in cases:
+                pending.append(case)
+                for sentence_dict in case['ERRORSENTS']:
+                    yield sentence_dict['SENT']
+
+        typo_lists = []
+        for typo_list in self.spell_checker.check_stream(sentences(), processes, chunk_size):
+            while not pending[0]['ERRORSENTS']:
+                yield pending.popleft(), []
+            typo_lists.append(typo_list)
+            if len(typo_lists) == len(pending[0]['ERRORSENTS']):
+                yield pending.popleft(), typo_lists
+                typo_lists = []
+        while pending:
+            yield pending.popleft(), []
+
+    def _score_case(self, case, typo_lists):
+        '''
+        mark the errors of 'case' detected and corrected, returns its counts
+        '''
+        counter = Counter()
+        for sentence_dict, typo_list in zip(case['ERRORSENTS'], typo_lists):
+            errors = sentence_dict['ERRORS']
+            for error in errors:
+                error['detected'] = 'False'
+                error['corrected'] = 'False'
+                if error['type'] == 'SPL':
+                    counter['typos'] += 1
+                    for typo_dict in typo_list:
+                        if int(error['start']) == typo_dict['start']:
+                            error['detected'] = 'True'
+                            counter['detected'] += 1
+                            if error['answer'].lower() == typo_dict['correction']:
+                                error['corrected'] = 'True'
+                                counter['corrected'] += 1
+                            break
+        return counter
+
+    def _run_identity(self):
+        '''
+        the checker settings and the test set a result file is made of
+        '''
+        checker = dict(self.spell_checker.init_kwargs)
+        checker.pop('shared_model', None)   # a block name, not a setting
+        return {'checker': checker,
+                'testset': self.ielts_path,
+                'testset_size': os.path.getsize(self.ielts_path)}
+
+    def _resumable(self, run):
+        if not os.path.exists(self.run_path):
+            logger.info('No run recorded in {}, starting over'.format(self.run_path))
+            return False
+        with codecs.open(self.run_path, 'r', encoding='utf8') as run_file:
+            saved = json.load(run_file)
+        if saved.get('complete'):
+            logger.info('The run of {} completed, starting over'.format(self.result_path))
+            return False
+        if any(saved.get(name) != value for name, value in run.items()):
+            logger.info('{} was made by another checker or test set, starting over'.format(self.result_path))
+            return False
+        return True
+
+    def _save_run(self, run, complete):
+        run = dict(run, complete=complete)
+        with codecs.open(self.run_path, 'w', encoding='utf8') as run_file:
+            json.dump(run, run_file)
+
+    def _load_results(self, counter):
+        '''
+        count the cases of an existing result file into 'counter' and return
+        how many there are; a last line cut short by a crash is dropped
+        '''
+        if not os.path.exists(self.result_path):
+            return 0
+        done = 0
+        offset = 0
+        with open(self.result_path, 'rb+') as result_file:
+            for line in result_file:
+                try:
+                    if not line.endswith(b'\n'):
+                        raise ValueError('incomplete line')
+                    case = json.loads(line.decode('utf8'))
+                except ValueError:
+                    logger.warning('Dropping the incomplete case {} of {}'.format(done + 1, self.result_path))
+                    break
+                for sentence_dict in case['ERRORSENTS']:
+                    for error in sentence_dict['ERRORS']:
+                        if error['type'] == 'SPL':
+                            counter['typos'] += 1
+                            counter['detected'] += error.get('detected') == 'True'
+                            counter['corrected'] += error.get('corrected') == 'True'
+                done += 1
+                offset += len(line)
+            result_file.truncate(offset)
+        return done
+
     def get_bad_case(self):
         pass
 
     def detection_speedtest(self):
-        t0 = time()
-        word_counter = 0
-
-        case_num = 0
-        for case in self.test_set:
-            print(case_num)
-            error_sentences = case['ERRORSENTS']
-            for sentence_dict in error_sentences:
-                sentence = sentence_dict['SENT']
-                word_list = self.spell_checker.words(sentence)
-                sentence_size = len(word_list)
-                word_counter += sentence_size
-                for word in word_list:
-                    self.spell_checker.detect(word)
-            case_num += 1
+        '''
+        detection time over the test set, see benchmark.py for all the stages
+        '''
+        word_lists = [self.spell_checker.words(sentence_dict['SENT'])
+                      for case in self.test_set for sentence_dict in case['ERRORSENTS']]
+        word_counter = sum(len(word_list) for word_list in word_lists)
 
+        t0 = time()
+        for word_list in word_lists:
+            self.spell_checker.detect_many(word_list)
         t1 = time()
+
         logger.info("word sum: {}".format(word_counter))
         logger.info("detection time: {:.3f}s".format( t1 - t0 ))
-        logger.info("detection time (per 100 words): {:.10f}s".format( (time() - t0) * 100.0 / word_counter ))
+        logger.info("detection time (per 100 words): {:.10f}s".format( (t1 - t0) * 100.0 / max(word_counter, 1) ))
+
+    def _load_spell_pairs(self):
+        '''
+        (answer, typo) pairs of the bundled spell_testset files ('answer: typo1 typo2 ...')
+        '''
+        pair_list = []
+        for data_path in self.spell_testset_paths:
+            with codecs.open(data_path, 'r', encoding='utf8') as in_file:
+                for line in in_file:
+                    if ':' not in line:
+                        continue
+                    answer, typos = line.split(':', 1)
+                    pair_list.extend((answer.strip(), typo) for typo in typos.split())
+        return pair_list
+
+    def _load_spell_testset(self, min_length=0):
+        '''
+        typos of the bundled spell_testset files
+        '''
+        return [typo for answer, typo in self._load_spell_pairs() if len(typo) >= min_length]
+
+    def candidates_speedtest(self, engines=('edits', 'symspell', 'trie'), typo_list=None):
+        '''
+        compare candidate engines on the typos detected in the test set (or
+        on 'typo_list'): index build time, index memory footprint and lookup
+        latency
+        '''
+        if typo_list is None:
+            typo_list = []
+            for case in self.test_set:
+                for sentence_dict in case['ERRORSENTS']:
+                    for token in self.spell_checker.tokenize(sentence_dict['SENT']):
+                        if self.spell_checker.detect(token):
+                            typo_list.append(token)
+        logger.info("typo sum: {}".format(len(typo_list)))
+
+        reference = None
+        for engine in engines:
+            # indexes are built on first use
+            t0 = time()
+            self.spell_checker.set_candidate_engine(engine)
+            self.spell_checker.candidate_index
+            build_time = time() - t0
+
+            tracemalloc.start()
+            self.spell_checker.set_candidate_engine(engine)
+            self.spell_checker.candidate_index
+            index_size = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+
+            t0 = time()
+            candidates_list = [self.spell_checker.candidates(typo) for typo in typo_list]
+            lookup_time = time() - t0
+
+            if reference is None:
+                reference = candidates_list
+            mismatch = sum(1 for a, b in zip(reference, candidates_list) if a != b)
+
+            logger.info("[{}] build time: {:.3f}s".format(engine, build_time))
+            logger.info("[{}] index memory: {:.1f}MB".format(engine, index_size / 1024.0 / 1024.0))
+            logger.info("[{}] lookup time: {:.3f}s ({:.3f}ms per typo)".format(engine, lookup_time, lookup_time * 1000.0 / max(len(typo_list), 1)))
+            logger.info("[{}] candidate sets differing from {}: {}".format(engine, engines[0], mismatch))
+
+        self.spell_checker.set_candidate_engine(engines[0])
+
+    def long_word_speedtest(self, min_length=12, engines=('edits', 'symspell', 'trie')):
+        '''
+        candidate engines on the long typos of the spell_testset files, where
+        the edits2 expansion is the most expensive
+        '''
+        typo_list = self._load_spell_testset(min_length)
+        self.candidates_speedtest(engines, typo_list)
+
+    def fallback_speedtest(self):
+        '''
+        coverage and latency of the fallback tiers on the spell_testset pairs
+        whose answer is a dictionary word: typos left without candidates,
+        answers among the candidates and typos corrected with no fallback,
+        each tier alone and both, then the time of each tier's lookups on
+        the typos the candidate engine finds nothing for
+        '''
+        spell_checker = self.spell_checker
+        qgram_index, phonetic_index = spell_checker.qgram_index, spell_checker.phonetic_index
+        indexes = {'qgram': qgram_index or spell_checker.build_qgram_index(),
+                   'phonetic': phonetic_index or spell_checker.build_phonetic_index()}
+        pair_list = [(answer, typo) for answer, typo in self._load_spell_pairs()
+                     if answer in spell_checker.word_dict and typo not in spell_checker.word_dict]
+        logger.info("pair sum: {}, phonetic keys: {}, bigrams: {}".format(
+            len(pair_list), len(indexes['phonetic'].buckets), len(indexes['qgram'].postings)))
+
+        for tiers in ((), ('qgram',), ('phonetic',), ('qgram', 'phonetic')):
+            label = ' + '.join(tiers) or 'no fallback'
+            spell_checker.qgram_index = indexes['qgram'] if 'qgram' in tiers else None
+            spell_checker.phonetic_index = indexes['phonetic'] if 'phonetic' in tiers else None
+            empty_counter = covered_counter = corrected_counter = 0
+            t0 = time()
+            for answer, typo in pair_list:
+                candidates = spell_checker.candidates(typo)
+                empty_counter += not candidates
+                covered_counter += answer in candidates
+                corrected_counter += spell_checker.correct_context(typo, ())[0] == answer
+            elapsed = time() - t0
+            logger.info("[{}] typos without candidates: {}/{}".format(label, empty_counter, len(pair_list)))
+            logger.info("[{}] answer among candidates: {}/{} ({:.3f})".format(label, covered_counter, len(pair_list), float(covered_counter) / max(len(pair_list), 1)))
+            logger.info("[{}] corrected typos: {}/{} ({:.3f})".format(label, corrected_counter, len(pair_list), float(corrected_counter) / max(len(pair_list), 1)))
+            logger.info("[{}] time: {:.3f}s ({:.3f}ms per typo)".format(label, elapsed, elapsed * 1000.0 / max(len(pair_list), 1)))
+
+        spell_checker.qgram_index, spell_checker.phonetic_index = indexes['qgram'], indexes['phonetic']
+        fallback_list = [typo for answer, typo in pair_list if not spell_checker._engine_candidates(typo)]
+        for name, lookup in (('qgram', spell_checker.qgram_candidates), ('phonetic', spell_checker.phonetic_candidates)):
+            t0 = time()
+            for typo in fallback_list:
+                lookup(typo)
+            elapsed = time() - t0
+            logger.info("[{} lookup] {} typos in {:.3f}s ({:.3f}ms per typo)".format(name, len(fallback_list), elapsed, elapsed * 1000.0 / max(len(fallback_list), 1)))
+
+        spell_checker.qgram_index, spell_checker.phonetic_index = qgram_index, phonetic_index
+        spell_checker.candidate_cache.clear()
+        spell_checker.correction_cache.clear()
+
+    def decoder_speedtest(self, beam_widths=(2, 8, 16)):
+        '''
+        correction accuracy and time of the greedy path against the beam
+        decoder with each of 'beam_widths'
+        '''
+        spell_checker = self.spell_checker
+        decoder, beam_width = spell_checker.decoder, spell_checker.beam_decoder.beam_width
+        sentences = [(d['SENT'], d['ERRORS']) for case in self.test_set for d in case['ERRORSENTS']]
+        settings = [('greedy', beam_width)] + [('beam', width) for width in beam_widths]
+
+        for name, width in settings:
+            spell_checker.decoder = name
+            spell_checker.beam_decoder.beam_width = width
+            # every setting starts cold
+            spell_checker.candidate_cache.clear()
+            spell_checker.correction_cache.clear()
+            typo_counter = 0
+            corrected_counter = 0
+            slowest = 0.0
+            t0 = time()
+            for sentence, errors in sentences:
+                t1 = time()
+                typo_list = spell_checker.check(sentence)
+                slowest = max(slowest, time() - t1)
+                corrections = dict((typo_dict['start'], typo_dict['correction']) for typo_dict in typo_list)
+                for error in errors:
+                    if error['type'] == 'SPL':
+                        typo_counter += 1
+                        if corrections.get(int(error['start'])) == error['answer'].lower():
+                            corrected_counter += 1
+            elapsed = time() - t0
+
+            label = name if name == 'greedy' else '{} {}'.format(name, width)
+            logger.info("[{}] corrected typos: {}/{} ({:.3f})".format(label, corrected_counter, typo_counter, float(corrected_counter) / max(typo_counter, 1)))
+            logger.info("[{}] check time: {:.3f}s ({:.3f}ms per sentence, slowest {:.3f}ms)".format(label, elapsed, elapsed * 1000.0 / max(len(sentences), 1), slowest * 1000.0))
+
+        spell_checker.decoder = decoder
+        spell_checker.beam_decoder.beam_width = beam_width
+        spell_checker.correction_cache.clear()
 
 
 def main():
+    setup_logging()
     evaluator = Evaluator()
     # evaluator.evaluate()
     evaluator.detection_speedtest()
@@ -0,0 +1,183 @@
+# !/usr/bin/env python3
+# -*- coding:utf-8 -*-
+# @author: Shengjia Yan
+# @date: 2026-10-18 Sunday
+# @email: i@yanshengjia.com
+# Copyright @ Shengjia Yan. All Rights Reserved.
+
+
+import json
+import functools
+from time import perf_counter
+from collections import Counter
+
+import numpy as np
+
+
+# SpellChecker methods timed as stages, the stages nest: check covers
+# tokenize, detect and correct or decode, which cover candidates and score
+STAGES = ('check', 'tokenize', 'detect', 'correct', 'decode', 'candidates', 'score')
+STAGE_METHODS = (('check', 'check'), ('tokenize', 'span_tokenize'), ('detect', 'detect_many'),
+                 ('correct', 'rank_greedy'), ('candidates', 'candidates'), ('score', 'score_context'))
+
+
+class Instrumentation:
+    '''
+    per-stage cumulative timers and event counters of a SpellChecker
+
+    attach() wraps the hot methods of one checker instance, detach() puts
+    the plain methods back: a checker that was never instrumented runs
+    exactly the code it runs without this module. counted events:
+        sentences, tokens, typos       checked sentences, their tokens, typos found
+        candidate_lookups, candidates  candidates() calls and candidates returned
+        edits2_fallbacks               lookups that found nothing within distance 1
+        qgram_fallbacks,               lookups that found nothing within max_edit_distance
+        phonetic_fallbacks             and went to a fallback tier
+        lm_order_<n>                   candidates scored by an n-gram of order n
+                                       (lm_order_0: not in the language model)
+    hooks are called as hook(stage, seconds) after every timed call. counts
+    are per process, the workers of check_stream keep their own
+    '''
+    def __init__(self):
+        self.seconds = Counter()
+        self.calls = Counter()
+        self.counters = Counter()
+        self.hooks = []
+        self.spell_checker = None
+
+    def add_hook(self, hook):
+        self.hooks.append(hook)
+        return hook
+
+    def remove_hook(self, hook):
+        self.hooks.remove(hook)
+
+    def record(self, stage, seconds):
+        self.seconds[stage] += seconds
+        self.calls[stage] += 1
+        for hook in self.hooks:
+            hook(stage, seconds)
+
+    def count(self, event, value=1):
+        self.counters[event] += value
+
+    def reset(self):
+        self.seconds.clear()
+        self.calls.clear()
+        self.counters.clear()
+
+    def _timed(self, stage, method, after=None):
+        @functools.wraps(method)
+        def timed(*args, **kwargs):
+            t0 = perf_counter()
+            result = method(*args, **kwargs)
+            self.record(stage, perf_counter() - t0)
+            if after is not None:
+                after(args, result)
+            return result
+        return timed
+
+    def _counted(self, method, after):
+        @functools.wraps(method)
+        def counted(*args, **kwargs):
+            result = method(*args, **kwargs)
+            after(args, result)
+            return result
+        return counted
+
+    def attach(self, spell_checker):
+        if self.spell_checker is not None:
+            raise ValueError('already attached to a spell checker')
+        self.spell_checker = spell_checker
+        after = {'check': self._after_check, 'tokenize': self._after_tokenize,
+                 'candidates': self._after_candidates}
+        for stage, name in STAGE_METHODS:
+            setattr(spell_checker, name, self._timed(stage, getattr(spell_checker, name), after.get(stage)))
+        decoder = spell_checker.beam_decoder
+        decoder.decode = self._timed('decode', decoder.decode)
+        # edits2 only runs when edits1 found nothing, the indexes report distances
+        spell_checker.edits2 = self._counted(spell_checker.edits2, self._after_edits2)
+        spell_checker.nearest = self._counted(spell_checker.nearest, self._after_nearest)
+        spell_checker.qgram_candidates = self._counted(spell_checker.qgram_candidates, self._after_qgram)
+        spell_checker.phonetic_candidates = self._counted(spell_checker.phonetic_candidates, self._after_phonetic)
+        lm = spell_checker.lm
+        lm.score_batch = self._counted(lm.score_batch, self._after_score_batch)
+        return self
+
+    def detach(self):
+        spell_checker = self.spell_checker
+        if spell_checker is None:
+            return
+        for name in [name for stage, name in STAGE_METHODS] + ['edits2', 'nearest', 'qgram_candidates', 'phonetic_candidates']:
+            spell_checker.__dict__.pop(name, None)
+        spell_checker.beam_decoder.__dict__.pop('decode', None)
+        spell_checker.lm.__dict__.pop('score_batch', None)
+        self.spell_checker = None
+
+    def _after_check(self, args, typo_list):
+        self.counters['sentences'] += 1
+        self.counters['typos'] += len(typo_list)
+
+    def _after_tokenize(self, args, token_list):
+        self.counters['tokens'] += len(token_list)
+
+    def _after_candidates(self, args, candidates):
+        self.counters['candidate_lookups'] += 1
+        self.counters['candidates'] += len(candidates)
+
+    def _after_edits2(self, args, edits):
+        self.counters['edits2_fallbacks'] += 1
+
+    def _after_nearest(self, args, nearest):
+        matches = args[0]
+        if self.spell_checker.max_edit_distance >= 2 and (not matches or min(matches.values()) >= 2):
+            self.counters['edits2_fallbacks'] += 1
+
+    def _after_qgram(self, args, candidates):
+        self.counters['qgram_fallbacks'] += 1
+
+    def _after_phonetic(self, args, candidates):
+        self.counters['phonetic_fallbacks'] += 1
+
+    def _after_score_batch(self, args, scores):
+        state, candidate_ids = args
+        orders = self.spell_checker.lm.backoff_orders(state, candidate_ids)
+        for order, number in enumerate(np.bincount(orders)):
+            if number:
+                self.counters['lm_order_{}'.format(order)] += int(number)
+
+    def snapshot(self):
+        '''
+        {'stages': {stage: {'seconds', 'calls', 'mean_ms'}}, 'counters': {..}}
+        '''
+        stages = {}
+        for stage in STAGES:
+            if self.calls[stage]:
+                stages[stage] = {'seconds': self.seconds[stage],
+                                 'calls': self.calls[stage],
+                                 'mean_ms': self.seconds[stage] * 1000.0 / self.calls[stage]}
+        counters = dict(self.counters)
+        if counters.get('candidate_lookups'):
+            counters['candidates_per_lookup'] = float(counters['candidates']) / counters['candidate_lookups']
+        return {'stages': stages, 'counters': counters}
+
+    def to_json(self):
+        return json.dumps(self.snapshot(), sort_keys=True)
+
+    def to_prometheus(self, prefix='spell_checker'):
+        '''
+        the counters in the Prometheus text exposition format
+        '''
+        lines = ['# HELP {}_stage_seconds_total Time spent in each stage.'.format(prefix),
+                 '# TYPE {}_stage_seconds_total counter'.format(prefix)]
+        lines += ['{}_stage_seconds_total{{stage="{}"}} {!r}'.format(prefix, stage, self.seconds[stage])
+                  for stage in STAGES if self.calls[stage]]
+        lines += ['# HELP {}_stage_calls_total Calls of each stage.'.format(prefix),
+                  '# TYPE {}_stage_calls_total counter'.format(prefix)]
+        lines += ['{}_stage_calls_total{{stage="{}"}} {}'.format(prefix, stage, self.calls[stage])
+                  for stage in STAGES if self.calls[stage]]
+        lines += ['# HELP {}_events_total Events counted while checking.'.format(prefix),
+                  '# TYPE {}_events_total counter'.format(prefix)]
+        lines += ['{}_events_total{{event="{}"}} {}'.format(prefix, event, value)
+                  for event, value in sorted(self.counters.items())]
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,291 @@
+# !/usr/bin/env python3
+# -*- coding:utf-8 -*-
+# @author: Shengjia Yan
+# @date: 2026-10-18 Sunday
+# @email: i@yanshengjia.com
+# Copyright @ Shengjia Yan. All Rights Reserved.
+
+
+import math
+from bisect import bisect_left
+
+import numpy as np
+from cache import LRUCache
+
+
+# an n-gram of order k > 1 is keyed by the index of its (k-1)-gram prefix in
+# the order k-1 table and the id of its last word:
+#   key = prefix_index << WORD_BITS | word_id
+# unigrams are indexed by word id directly
+WORD_BITS = 24
+MAX_WORDS = 1 << WORD_BITS
+MAX_CONTEXTS = 1 << (64 - WORD_BITS)
+
+# words missing from the unigrams score as the model's <unk>, or as
+# FLOOR_LOG_P (the ARPA convention for log10(0)) when it has none
+UNK = '<unk>'
+FLOOR_LOG_P = -99.0
+
+
+def pack_key(prefix_index, word_id):
+    return (prefix_index << WORD_BITS) | word_id
+
+
+class PackedLM:
+    '''
+    n-gram backoff language model over integer word ids
+
+    vocab is sorted, so a word id is its rank; order k (1-based) has
+    log_p[k - 1] and log_bw[k - 1] float64 arrays and, for k > 1, a sorted
+    uint64 keys[k - 1] array (keys[0] is None). n-grams that only exist as the
+    prefix of a longer n-gram have a NaN log_p and count as absent
+    '''
+    def __init__(self, vocab, keys, log_p, log_bw):
+        self.vocab = vocab
+        self.keys = keys
+        self.log_p = log_p
+        self.log_bw = log_bw
+        self.order = len(log_p)
+        self._ids = {}      # vocabulary words looked up so far, at most len(vocab) of them
+        self._states = LRUCache(100000)     # context ids -> context_state
+        # plain memoryviews for scalar lookups, indexing them and bisecting
+        # them is much cheaper than going through numpy for a single value
+        self._keys = [None] + [self._view(k, 'Q') for k in keys[1:]]
+        self._log_p = [self._view(v, 'd') for v in log_p]
+        self._log_bw = [self._view(v, 'd') for v in log_bw]
+        self.unk_log_p = FLOOR_LOG_P    # unigram() falls back on it, <unk> included
+        self.unk_log_p = self.unigram(self.word_id(UNK))
+
+    def _view(self, values, fmt):
+        return memoryview(values).cast('B').cast(fmt)
+
+    @classmethod
+    def from_dict(cls, lm):
+        '''
+        build from the lm.json layout: {'w1 w2 w3': {'log_p': .., 'log_bw': ..}}
+        '''
+        ngrams = {}     # tuple of words -> (log_p, log_bw)
+        words = set()
+        for ngram, value in lm.items():
+            gram = tuple(ngram.split(' '))
+            ngrams[gram] = (float(value['log_p']), float(value['log_bw']))
+            words.update(gram)
+        order = max(len(gram) for gram in ngrams) if ngrams else 1
+
+        vocab = sorted(words)
+        if len(vocab) > MAX_WORDS:
+            raise ValueError('vocabulary exceeds {} words'.format(MAX_WORDS))
+        word_id = dict((w, i) for i, w in enumerate(vocab))
+
+        by_order = [dict() for _ in range(order)]
+        for gram, value in ngrams.items():
+            by_order[len(gram) - 1][gram] = value
+        # every n-gram needs its prefix to be addressable
+        for k in range(order - 1, 0, -1):
+            for gram in by_order[k]:
+                by_order[k - 1].setdefault(gram[:-1], (math.nan, 0.0))
+        for word in vocab:
+            by_order[0].setdefault((word,), (math.nan, 0.0))
+
+        log_p = [np.array([by_order[0][(w,)][0] for w in vocab], dtype=np.float64)]
+        log_bw = [np.array([by_order[0][(w,)][1] for w in vocab], dtype=np.float64)]
+        keys = [None]
+        index = word_id     # tuple prefix of the previous order -> its index
+        for k in range(1, order):
+            if len(index) > MAX_CONTEXTS:
+                raise ValueError('too many {}-grams to pack'.format(k))
+            grams = list(by_order[k])
+            packed = np.array([pack_key(index[g[:-1]] if k > 1 else word_id[g[0]], word_id[g[-1]]) for g in grams],
+                              dtype=np.uint64)
+            permutation = np.argsort(packed, kind='stable')
+            keys.append(packed[permutation])
+            log_p.append(np.array([by_order[k][grams[i]][0] for i in permutation], dtype=np.float64))
+            log_bw.append(np.array([by_order[k][grams[i]][1] for i in permutation], dtype=np.float64))
+            index = dict((grams[i], position) for position, i in enumerate(permutation))
+        return cls(vocab, keys, log_p, log_bw)
+
+    def __len__(self):
+        return sum(int(np.count_nonzero(~np.isnan(values))) for values in self.log_p)
+
+    def word_id(self, word):
+        '''
+        id of 'word', -1 if it is not in the vocabulary. misses are not
+        cached, the contexts of a long-running process hold ever new tokens
+        '''
+        word_id = self._ids.get(word)
+        if word_id is None:
+            position = bisect_left(self.vocab, word)
+            if position < len(self.vocab) and self.vocab[position] == word:
+                word_id = self._ids[word] = position
+            else:
+                word_id = -1
+        return word_id
+
+    def _child(self, k, index, word_id):
+        '''
+        index of the order k + 1 n-gram extending entry 'index' of order k with
+        'word_id', -1 if missing
+        '''
+        if index < 0 or word_id < 0 or k >= self.order:
+            return -1
+        keys = self._keys[k]
+        key = pack_key(index, word_id)
+        position = bisect_left(keys, key)
+        if position == len(keys) or keys[position] != key:
+            return -1
+        return position
+
+    def word_ids(self, words):
+        '''
+        ids of 'words' as an int64 array, -1 for unknown words
+        '''
+        return np.array([self.word_id(word) for word in words], dtype=np.int64)
+
+    def find(self, ids):
+        '''
+        index of the n-gram 'ids' in the table of its order, -1 if missing
+        (prefix-only entries included)
+        '''
+        index = ids[0]
+        for k in range(1, len(ids)):
+            index = self._child(k, index, ids[k])
+        return index
+
+    def lookup(self, ids):
+        '''
+        (log_p, log_bw) of the n-gram 'ids', None if it is absent
+        '''
+        if len(ids) > self.order:
+            return None
+        index = self.find(ids)
+        if index < 0:
+            return None
+        k = len(ids) - 1
+        log_p = self._log_p[k][index]
+        if log_p != log_p:     # NaN, prefix-only entry
+            return None
+        return log_p, self._log_bw[k][index]
+
+    def unigram(self, word_id):
+        '''
+        unigram log_p of 'word_id', unk_log_p for words missing from the unigrams
+        '''
+        if word_id < 0:
+            return self.unk_log_p
+        log_p = self._log_p[0][word_id]
+        return log_p if log_p == log_p else self.unk_log_p
+
+    def context_state(self, context_ids):
+        '''
+        backoff state of a history, oldest word first: the suffixes of its last
+        order - 1 words found in the model, longest first, as
+        (k, index, log_bw) with k the suffix length and log_bw 0 for prefix-only
+        entries. computed once, it scores any number of words in that history
+        '''
+        context_ids = tuple(context_ids)
+        if self.order == 1:
+            return ()
+        context_ids = context_ids[-(self.order - 1):]
+        state = self._states.get(context_ids)
+        if state is not None:
+            return state
+        entries = []
+        for start in range(len(context_ids)):
+            index = self.find(context_ids[start:])
+            if index < 0:
+                continue
+            k = len(context_ids) - start
+            real = self._log_p[k - 1][index] == self._log_p[k - 1][index]
+            entries.append((k, index, self._log_bw[k - 1][index] if real else 0.0))
+        state = tuple(entries)
+        self._states.put(context_ids, state)
+        return state
+
+    def score_state(self, state, word_id):
+        '''
+        log10 P(word | history) with Katz backoff: the longest suffix of the
+        history followed by 'word' in the model gives its log_p, plus the
+        backoff weights of the longer suffixes that were tried first
+        '''
+        backoff = 0.0
+        if word_id >= 0:
+            for k, index, log_bw in state:
+                child = self._child(k, index, word_id)
+                if child >= 0:
+                    log_p = self._log_p[k][child]
+                    if log_p == log_p:
+                        return backoff + log_p
+                backoff += log_bw
+        else:
+            for k, index, log_bw in state:
+                backoff += log_bw
+        return backoff + self.unigram(word_id)
+
+    def log_prob(self, c, b, a):
+        '''
+        log10 P(c | a b) with Katz backoff, see SpellChecker.probability
+        '''
+        state = self.context_state((self.word_id(a), self.word_id(b)))
+        return self.score_state(state, self.word_id(c))
+
+    def _children(self, k, index, word_ids):
+        '''
+        vectorized _child: indices of the order k + 1 n-grams extending entry
+        'index' of order k with each of 'word_ids', -1 where missing
+        '''
+        missing = np.full(len(word_ids), -1, dtype=np.int64)
+        if index < 0 or k >= self.order or not len(self.keys[k]):
+            return missing
+        keys = self.keys[k]
+        valid = word_ids >= 0
+        packed = np.uint64(index << WORD_BITS) | word_ids.clip(0).astype(np.uint64)
+        positions = np.searchsorted(keys, packed).clip(max=len(keys) - 1)
+        found = valid & (keys[positions] == packed)
+        return np.where(found, positions, missing)
+
+    def _gather(self, k, indices):
+        '''
+        log_p of order k + 1 at 'indices', NaN where the index is -1
+        '''
+        if k >= self.order or not len(self.log_p[k]):
+            return np.full(len(indices), np.nan)
+        return np.where(indices >= 0, self.log_p[k][indices.clip(0)], np.nan)
+
+    def score_batch(self, state, candidate_ids):
+        '''
+        score_state for every candidate id at once
+        '''
+        ids = np.asarray(candidate_ids, dtype=np.int64)
+        scores = np.full(len(ids), np.nan)
+        backoff = 0.0
+        for k, index, log_bw in state:
+            found = self._gather(k, self._children(k, index, ids))
+            hit = np.isnan(scores) & ~np.isnan(found)
+            scores[hit] = backoff + found[hit]
+            backoff += log_bw
+        rest = np.isnan(scores)
+        unigram = np.where(ids[rest] >= 0, self.log_p[0][ids[rest].clip(0)], np.nan)
+        scores[rest] = backoff + np.where(np.isnan(unigram), self.unk_log_p, unigram)
+        return scores
+
+    def backoff_orders(self, state, candidate_ids):
+        '''
+        order of the n-gram score_batch scores each candidate with, 0 for
+        candidates missing from the unigrams
+        '''
+        ids = np.asarray(candidate_ids, dtype=np.int64)
+        orders = np.zeros(len(ids), dtype=np.int64)
+        for k, index, log_bw in state:
+            found = ~np.isnan(self._gather(k, self._children(k, index, ids)))
+            orders[(orders == 0) & found] = k + 1
+        rest = orders == 0
+        unigram = np.where(ids[rest] >= 0, self.log_p[0][ids[rest].clip(0)], np.nan)
+        orders[np.flatnonzero(rest)[~np.isnan(unigram)]] = 1
+        return orders
+
+    def log_prob_batch(self, candidate_ids, b, a):
+        '''
+        log10 P(c | a b) for every candidate id c at once, same values as
+        log_prob
+        '''
+        return self.score_batch(self.context_state((self.word_id(a), self.word_id(b))), candidate_ids)
@@ -0,0 +1,145 @@
+# !/usr/bin/env python3
+# -*- coding:utf-8 -*-
+# @author: Shengjia Yan
+# @date: 2026-10-18 Sunday
+# @email: i@yanshengjia.com
+# Copyright @ Shengjia Yan. All Rights Reserved.
+
+
+from edit_distance import damerau_levenshtein
+
+
+VOWELS = frozenset('aeiouy')
+FRONT_VOWELS = frozenset('eiy')
+# silent first letter of these onsets: knight, gnome, pneumonia, wrong, aesthetic
+SILENT_ONSETS = ('kn', 'gn', 'pn', 'wr', 'ae')
+
+
+def phonetic_key(word):
+    '''
+    Metaphone-like sound key of 'word': consonant sounds only, with the
+    spellings of one sound mapped to a single code (c/k/q/ck -> K, ph/f/v ->
+    F, ch/sh/tio/cia -> X, th -> 0, soft c/s/z -> S, soft g/j/dge -> J...),
+    vowels dropped but for a leading one (A) and repeated codes collapsed,
+    so that sound-alike spellings share a key:
+        exstacy, ecstasy               -> AKSTS
+        pronounciation, pronunciation  -> PRNXN
+    '''
+    word = ''.join(char for char in word.lower() if 'a' <= char <= 'z')
+    if not word:
+        return ''
+    if word[:2] in SILENT_ONSETS:
+        word = word[1:]
+    elif word[0] == 'x':
+        word = 's' + word[1:]
+    elif word[:2] == 'wh':
+        word = 'w' + word[2:]
+
+    codes = []
+    length = len(word)
+    for i, char in enumerate(word):
+        previous = word[i - 1] if i > 0 else ''
+        following = word[i + 1] if i + 1 < length else ''
+        after = word[i + 2] if i + 2 < length else ''
+        if char == previous and char != 'c':
+            continue
+        if char in VOWELS and not (char == 'y' and following in VOWELS):
+            if i == 0:
+                codes.append('A')
+            continue
+        if char == 'b':
+            if not (previous == 'm' and i == length - 1):       # dumb, climb
+                codes.append('B')
+        elif char == 'c':
+            if following == 'i' and after == 'a' or following == 'h':
+                codes.append('K' if previous == 's' else 'X')   # school, but much, special
+            elif following in FRONT_VOWELS:
+                if previous != 's':                              # science, scene
+                    codes.append('S')
+            else:
+                codes.append('K')
+        elif char == 'd':
+            codes.append('J' if following == 'g' and after in FRONT_VOWELS else 'T')
+        elif char == 'g':
+            if following == 'h' and after not in VOWELS:
+                continue                                         # night, though
+            if following == 'n' and (i + 2 == length or word[i + 2:i + 4] == 'ed'):
+                continue                                         # sign, signed
+            if previous == 'd' and following in FRONT_VOWELS:
+                continue                                         # bridge: dge is one J
+            codes.append('J' if following in FRONT_VOWELS else 'K')
+        elif char == 'h':
+            if previous and previous in 'cgpst':
+                continue                                         # part of ch, gh, ph, sh, th
+            if previous in VOWELS and following not in VOWELS:
+                continue                                         # oh, ah
+            codes.append('H')
+        elif char == 'k':
+            if previous != 'c':
+                codes.append('K')
+        elif char == 'p':
+            codes.append('F' if following == 'h' else 'P')
+        elif char == 'q':
+            codes.append('K')
+        elif char == 's':
+            if following == 'h' or following == 'i' and after and after in 'ao':
+                codes.append('X')                                # ship, mission, asia
+            else:
+                codes.append('S')
+        elif char == 't':
+            if following == 'i' and after and after in 'ao':
+                codes.append('X')                                # nation, partial
+            elif following == 'h':
+                codes.append('0')
+            elif not (following == 'c' and after == 'h'):        # watch
+                codes.append('T')
+        elif char == 'v':
+            codes.append('F')
+        elif char == 'w':
+            if following in VOWELS:
+                codes.append('W')
+        elif char == 'x':
+            codes.append('KS')
+        elif char == 'y':
+            codes.append('Y')
+        elif char == 'z':
+            codes.append('S')
+        else:                                                    # f j l m n r
+            codes.append(char.upper())
+
+    key = []
+    for code in ''.join(codes):
+        if not key or key[-1] != code:
+            key.append(code)
+    return ''.join(key)
+
+
+class PhoneticIndex:
+    '''
+    phonetic key -> dictionary words, for the typos an edit-distance search
+    cannot reach: a lookup computes one key and probes one bucket, whatever
+    the number of edits between the typo and the words it sounds like
+    '''
+    def __init__(self, words):
+        self.buckets = {}   # phonetic key -> [word, ...]
+        for word in words:
+            key = phonetic_key(word)
+            if not key:
+                continue
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                self.buckets[key] = [word]
+            else:
+                bucket.append(word)
+
+    def search(self, word, max_distance=None):
+        '''
+        dictionary words sharing the phonetic key of 'word' within
+        'max_distance' edits of it (any distance by default), as {word: distance}
+        '''
+        matches = {}
+        for candidate in self.buckets.get(phonetic_key(word), ()):
+            distance = damerau_levenshtein(word, candidate, max_distance)
+            if max_distance is None or distance <= max_distance:
+                matches[candidate] = distance
+        return matches
@@ -0,0 +1,136 @@
+# !/usr/bin/env python3
+# -*- coding:utf-8 -*-
+# @author: Shengjia Yan
+# @date: 2026-10-18 Sunday
+# @email: i@yanshengjia.com
+# Copyright @ Shengjia Yan. All Rights Reserved.
+
+
+import numpy as np
+from edit_distance import damerau_levenshtein
+
+
+PAD = '\x00'    # marks both ends of a word, so its first and last characters are in q grams too
+ALPHABET = 'abcdefghijklmnopqrstuvwxyz'
+
+
+def letter_counts(word):
+    '''
+    histogram of 'word' over ALPHABET, any other character in the last bin
+    '''
+    counts = np.zeros(len(ALPHABET) + 1, dtype=np.int16)
+    for char in word:
+        index = ALPHABET.find(char)
+        counts[index] += 1      # -1: the last bin
+    return counts
+
+
+def qgrams(word, q=2):
+    '''
+    the q-grams of 'word' padded with q - 1 PAD on each side, a repeated
+    gram numbered by its occurrence so that the intersection of two such
+    sets is the multiset intersection of the grams:
+        qgrams('aaa') -> {('\\x00a', 0), ('aa', 0), ('aa', 1), ('a\\x00', 0)}
+    '''
+    padded = PAD * (q - 1) + word + PAD * (q - 1)
+    seen = {}
+    grams = []
+    for i in range(len(padded) - q + 1):
+        gram = padded[i:i + q]
+        occurrence = seen.get(gram, 0)
+        seen[gram] = occurrence + 1
+        grams.append((gram, occurrence))
+    return grams
+
+
+class QGramIndex:
+    '''
+    inverted index of the character q-grams of the dictionary, for the typos
+    further than the candidate engine searches
+
+    words get ids in (length, word) order and every gram a sorted int32
+    array of the ids of the words containing it, so the words of one length
+    range are one slice of each posting list. a lookup merges the slices of
+    the grams of the typo and keeps the words sharing enough of them: an
+    edit destroys at most q grams, a transposition q + 1, so a word within
+    k edits of a typo of length n shares at least
+        max(n, length) + q - 1 - (q + 1) * k
+    of its grams (count filter). at larger distances that bound gets loose,
+    so the shortlist also goes through a bag filter: an edit changes the
+    letter histogram by at most 2, a transposition not at all. the survivors
+    are verified with a bounded Damerau-Levenshtein distance. only the
+    posting lists of the typo are touched, never the whole vocabulary,
+    except for the lengths where the count bound is not positive: then a
+    word may share no gram at all with the typo and the whole length range
+    is scanned. that happens as soon as (q + 1) * k >= n + q - 1, e.g. at
+    k = 3 for any typo of 8 characters or fewer with bigrams, which is why
+    SpellChecker.qgram_candidates queries at k <= n // 3 only, where it is
+    at least q - 1
+    '''
+    def __init__(self, words, q=2):
+        self.q = q
+        self.words = sorted(words, key=lambda word: (len(word), word))
+        self.lengths = np.array([len(word) for word in self.words], dtype=np.int32)
+        max_length = int(self.lengths.max()) if len(self.words) else 0
+        # ids of the words of length l: length_starts[l] <= id < length_starts[l + 1]
+        self.length_starts = np.searchsorted(self.lengths, np.arange(max_length + 2)).astype(np.int32)
+        postings = {}
+        for word_id, word in enumerate(self.words):
+            for gram in qgrams(word, q):
+                posting = postings.get(gram)
+                if posting is None:
+                    postings[gram] = [word_id]
+                else:
+                    posting.append(word_id)
+        self.postings = dict((gram, np.array(posting, dtype=np.int32)) for gram, posting in postings.items())
+        self.letter_counts = np.array([letter_counts(word) for word in self.words], dtype=np.int16).reshape(-1, len(ALPHABET) + 1)
+
+    def _first_id(self, length):
+        '''
+        id of the first word of 'length' characters or more
+        '''
+        return int(self.length_starts[min(max(length, 0), len(self.length_starts) - 1)])
+
+    def shortlist(self, word, max_distance):
+        '''
+        ids of the words passing the length, count and bag filters for 'word'
+        '''
+        q = self.q
+        length = len(word)
+        low = self._first_id(length - max_distance)
+        high = self._first_id(length + max_distance + 1)
+        if low >= high:
+            return np.empty(0, dtype=np.int32)
+
+        slices = []
+        for gram in qgrams(word, q):
+            posting = self.postings.get(gram)
+            if posting is not None:
+                slices.append(posting[np.searchsorted(posting, low):np.searchsorted(posting, high)])
+        if slices:
+            ids, counts = np.unique(np.concatenate(slices), return_counts=True)
+            thresholds = np.maximum(self.lengths[ids], length) + q - 1 - (q + 1) * max_distance
+            ids = ids[counts >= thresholds]
+        else:
+            ids = np.empty(0, dtype=np.int32)
+
+        # lengths whose words may share no gram at all with 'word'
+        unfiltered = [np.arange(self._first_id(other), self._first_id(other + 1), dtype=np.int32)
+                      for other in range(max(length - max_distance, 0), length + max_distance + 1)
+                      if max(other, length) + q - 1 - (q + 1) * max_distance <= 0]
+        if unfiltered:
+            ids = np.union1d(ids, np.concatenate(unfiltered))
+        bag_distances = np.abs(self.letter_counts[ids] - letter_counts(word)).sum(axis=1)
+        return ids[bag_distances <= 2 * max_distance]
+
+    def search(self, word, max_distance=3):
+        '''
+        dictionary words within 'max_distance' edits of 'word', as {word: distance}
+        '''
+        matches = {}
+        for word_id in self.shortlist(word, max_distance).tolist():
+            candidate = self.words[word_id]
+            distance = damerau_levenshtein(word, candidate, max_distance)
+            if distance <= max_distance:
+                matches[candidate] = distance
+        return matches
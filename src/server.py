@@ -0,0 +1,255 @@
+# !/usr/bin/env python3
+# -*- coding:utf-8 -*-
+# @author: Shengjia Yan
+# @date: 2026-10-18 Sunday
+# @email: i@yanshengjia.com
+# Copyright @ Shengjia Yan. All Rights Reserved.
+
+
+import json
+import signal
+import asyncio
+import argparse
+import multiprocessing
+import concurrent.futures
+from time import time
+import spell
+from spell import SpellChecker
+
+import logging
+logger = logging.getLogger('server')
+
+
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+           413: 'Payload Too Large', 503: 'Service Unavailable'}
+MAX_BODY = 1 << 20
+
+
+class SpellService:
+    '''
+    asyncio HTTP/JSON front end of a SpellChecker
+
+        POST /check   {"text": "..."}  ->  {"typos": [typo dicts of check()]}
+        GET  /health                   ->  {"status": "ok", ...counters}
+
+    concurrent requests are coalesced into micro-batches: a batch is sent as
+    soon as it holds 'max_batch_size' sentences or 'max_latency' seconds after
+    its first one arrived. batches run on 'workers' processes forked from this
+    one (sharing its model, see SpellChecker.check_stream), or in a thread
+    when workers is 0. at most 'max_pending' sentences wait for a batch, any
+    more are answered 503 right away instead of queueing without bound
+    '''
+    def __init__(self, spell_checker, workers=None, max_batch_size=32, max_latency=0.005, max_pending=1024):
+        self.spell_checker = spell_checker
+        self.workers = multiprocessing.cpu_count() if workers is None else workers
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency
+        self.max_pending = max_pending
+        self.queue = None
+        self.executor = None
+        self.in_flight = None
+        self.counters = {'requests': 0, 'rejected': 0, 'batches': 0, 'batched_sentences': 0}
+
+    def _executor(self):
+        if self.workers <= 0:
+            return concurrent.futures.ThreadPoolExecutor(1)
+        if 'fork' in multiprocessing.get_all_start_methods():
+            context = multiprocessing.get_context('fork')
+            spell._worker_checker = self.spell_checker.warmup()
+        else:
+            context = multiprocessing.get_context()
+        return concurrent.futures.ProcessPoolExecutor(self.workers, mp_context=context, initializer=spell._init_worker,
+                                                      initargs=(self.spell_checker.init_kwargs,))
+
+    async def start(self, host='127.0.0.1', port=8080):
+        self.queue = asyncio.Queue(self.max_pending)
+        self.executor = self._executor()
+        # two batches per worker: one running, one ready to go
+        self.in_flight = asyncio.Semaphore(max(self.workers, 1) * 2)
+        self.batcher = asyncio.ensure_future(self._batch_loop())
+        self.server = await asyncio.start_server(self._handle_connection, host, port)
+        logger.info('Listening on {}:{} ({} workers, batches of up to {} within {:.1f}ms)'.format(
+            host, port, self.workers, self.max_batch_size, self.max_latency * 1000.0))
+        return self.server
+
+    async def close(self):
+        self.server.close()
+        await self.server.wait_closed()
+        self.batcher.cancel()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        spell._worker_checker = None
+
+    async def check(self, text):
+        '''
+        typo list of 'text', batched with concurrent calls; raises
+        asyncio.QueueFull when too many sentences are already waiting
+        '''
+        future = asyncio.get_running_loop().create_future()
+        self.queue.put_nowait((text, future))
+        return await future
+
+    async def _batch_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.max_latency
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            await self.in_flight.acquire()
+            asyncio.ensure_future(self._run_batch(batch))
+
+    async def _run_batch(self, batch):
+        try:
+            self.counters['batches'] += 1
+            self.counters['batched_sentences'] += len(batch)
+            texts = [text for text, future in batch]
+            if self.workers <= 0:
+                task = asyncio.get_running_loop().run_in_executor(self.executor, self._check_all, texts)
+            else:
+                task = asyncio.get_running_loop().run_in_executor(self.executor, spell._check_chunk, texts)
+            try:
+                results = await task
+            except Exception as error:
+                logger.exception('Batch of {} sentences failed'.format(len(batch)))
+                for text, future in batch:
+                    if not future.done():
+                        future.set_exception(error)
+                return
+            for (text, future), typo_list in zip(batch, results):
+                if not future.done():
+                    future.set_result(typo_list)
+        finally:
+            self.in_flight.release()
+
+    def _check_all(self, texts):
+        return [self.spell_checker.check(text) for text in texts]
+
+    def health(self):
+        counters = dict(self.counters)
+        counters['status'] = 'ok'
+        counters['pending'] = self.queue.qsize()
+        counters['workers'] = self.workers
+        counters['mean_batch_size'] = float(counters['batched_sentences']) / counters['batches'] if counters['batches'] else 0.0
+        return counters
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                parts = request_line.decode('latin-1').split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                length = headers.get('content-length', '0')
+                if not (length.isascii() and length.isdigit()):
+                    # nothing tells where the body ends, the connection cannot be reused
+                    await self._respond(writer, 400, {'error': 'invalid Content-Length'}, keep_alive=False)
+                    break
+                length = int(length)
+                if length > MAX_BODY:
+                    await self._respond(writer, 413, {'error': 'request body too large'}, keep_alive=False)
+                    break
+                body = await reader.readexactly(length) if length else b''
+                keep_alive = headers.get('connection', '').lower() != 'close' and parts[-1:] == ['HTTP/1.1']
+                status, payload = await self._route(parts, body)
+                await self._respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _route(self, parts, body):
+        if len(parts) != 3:
+            return 400, {'error': 'malformed request line'}
+        method, path = parts[0], parts[1]
+        if path == '/health':
+            return 200, self.health()
+        if path != '/check':
+            return 404, {'error': 'unknown path: {}'.format(path)}
+        if method != 'POST':
+            return 405, {'error': 'use POST'}
+        try:
+            text = json.loads(body.decode('utf8'))['text']
+            if not isinstance(text, str):
+                raise TypeError(text)
+        except (ValueError, KeyError, TypeError):
+            return 400, {'error': 'expected a JSON object with a "text" string'}
+
+        self.counters['requests'] += 1
+        try:
+            typo_list = await self.check(text)
+        except asyncio.QueueFull:
+            self.counters['rejected'] += 1
+            return 503, {'error': 'too many pending requests'}
+        return 200, {'typos': typo_list}
+
+    async def _respond(self, writer, status, payload, keep_alive=True):
+        body = json.dumps(payload).encode('utf8')
+        head = 'HTTP/1.1 {} {}\r\nContent-Type: application/json\r\nContent-Length: {}\r\nConnection: {}\r\n'.format(
+            status, REASONS[status], len(body), 'keep-alive' if keep_alive else 'close')
+        if status == 503:
+            head += 'Retry-After: 1\r\n'
+        writer.write(head.encode('latin-1') + b'\r\n' + body)
+        await writer.drain()
+
+
+async def serve(service, host, port):
+    server = await service.start(host, port)
+    stopped = asyncio.get_running_loop().create_future()
+    try:
+        # SIGTERM stops serving like Ctrl-C, so that main() cleans up
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, stopped.set_result, None)
+    except NotImplementedError:     # Windows
+        pass
+    try:
+        async with server:
+            await asyncio.wait([asyncio.ensure_future(server.serve_forever()), stopped],
+                               return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        await service.close()
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='[%(levelname)s] (%(asctime)s) (%(name)s) %(message)s')
+    parser = argparse.ArgumentParser(description='spell checking HTTP service')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--workers', type=int, default=None, help='checking processes, 0 checks in a thread')
+    parser.add_argument('--max-batch-size', type=int, default=32)
+    parser.add_argument('--max-latency-ms', type=float, default=5.0, help='how long a batch waits to fill up')
+    parser.add_argument('--max-pending', type=int, default=1024, help='waiting sentences before answering 503')
+    parser.add_argument('--lm-format', default='binary', choices=spell.LM_FORMATS)
+    parser.add_argument('--candidate-engine', default='symspell', choices=spell.CANDIDATE_ENGINES)
+    parser.add_argument('--shared-model', action='store_true', help='workers read one copy of the model in shared memory')
+    args = parser.parse_args()
+
+    t0 = time()
+    spell_checker = SpellChecker(candidate_engine=args.candidate_engine, lm_format=args.lm_format).warmup()
+    shared_model = spell_checker.publish_model() if args.shared_model else None
+    logger.info('Model loaded in {:.3f}s'.format(time() - t0))
+    service = SpellService(spell_checker, args.workers, args.max_batch_size, args.max_latency_ms / 1000.0, args.max_pending)
+    try:
+        asyncio.run(serve(service, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if shared_model is not None:
+            shared_model.unlink()
+
+
+if __name__ == '__main__':
+    main()
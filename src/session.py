@@ -0,0 +1,211 @@
+# !/usr/bin/env python3
+# -*- coding:utf-8 -*-
+# @author: Shengjia Yan
+# @date: 2026-10-18 Sunday
+# @email: i@yanshengjia.com
+# Copyright @ Shengjia Yan. All Rights Reserved.
+
+
+import re
+import numpy as np
+
+
+# a document is cut after the whitespace that follows a sentence end or
+# ends a line. no token spans whitespace, so tokenizing the pieces one by
+# one gives exactly the tokens of the whole text
+SEGMENT_BOUNDARY = re.compile(r'(?<=[.!?])\s+|\n\s*')
+
+
+def split_segments(text):
+    '''
+    'text' cut into sentences, each keeping its trailing whitespace
+    '''
+    pieces = []
+    start = 0
+    for match in SEGMENT_BOUNDARY.finditer(text):
+        if match.end() < len(text):
+            pieces.append(text[start:match.end()])
+            start = match.end()
+    pieces.append(text[start:])
+    return pieces
+
+
+class Segment:
+    '''
+    one sentence of a DocumentSession: its text, its tokens with offsets
+    relative to the sentence, which of them are typos, and the correction
+    of every typo with the context it was corrected in
+    '''
+    __slots__ = ('text', 'tokens', 'spans', 'is_typo', 'typos')
+
+    def __init__(self, spell_checker, text):
+        self.text = text
+        token_list = spell_checker.span_tokenize(text)
+        self.tokens = [token_record.token for token_record in token_list]
+        self.spans = [(token_record.start, token_record.end) for token_record in token_list]
+        self.is_typo = spell_checker.detect_many(self.tokens) if self.tokens else []
+        self.typos = {}     # token index -> (left, right, correction)
+
+
+class DocumentSession:
+    '''
+    a document kept checked while it is edited, for live editors
+
+    the text is held as sentences (see split_segments) with their tokens
+    and typos, and the start offset of every sentence in a numpy array.
+    edit() re-tokenizes only the sentences the edit touches, shifts the
+    start offsets of the following ones with one vectorised add and
+    re-corrects:
+        - the typos of the re-tokenized sentences whose word or context
+          changed, the others keep their correction without being scored
+        - the typos of the neighbouring sentences whose context reaches
+          into the edit (the lm.order - 1 tokens after it, the
+          right_context tokens before it)
+    so the work of an edit depends on the sentences it touches, not on
+    the length of the document. with the greedy decoder typos() is always
+    what check() returns for text; the beam decoder corrects the typos of
+    each sentence jointly, given the words before it
+    '''
+    def __init__(self, spell_checker, text=''):
+        self.spell_checker = spell_checker
+        self.segments = []
+        self.starts = np.zeros(0, dtype=np.int64)
+        self.length = 0
+        self.edit(0, 0, text)
+
+    @property
+    def text(self):
+        return ''.join(segment.text for segment in self.segments)
+
+    def _segment_at(self, offset):
+        '''
+        index of the sentence holding the character at 'offset'
+        '''
+        return int(np.searchsorted(self.starts, offset, side='right')) - 1
+
+    def edit(self, offset, delete_len, insert_text):
+        '''
+        replace the 'delete_len' characters at 'offset' with 'insert_text',
+        returns the typo dicts (see check) of the re-checked sentences, the
+        typos after them keep their correction and move by the length change
+        '''
+        if offset < 0 or delete_len < 0 or offset + delete_len > self.length:
+            raise ValueError('edit ({}, {}) out of a document of {} characters'.format(offset, delete_len, self.length))
+        end = offset + delete_len
+        if self.segments:
+            # the sentences holding the characters on both sides of the edit,
+            # so that tokens joined or split by it are re-tokenized whole
+            first = self._segment_at(offset - 1) if offset > 0 else 0
+            last = self._segment_at(end) if end < self.length else len(self.segments) - 1
+            span_start = int(self.starts[first])
+        else:
+            first, last, span_start = 0, -1, 0
+        old_segments = self.segments[first:last + 1]
+        old_text = ''.join(segment.text for segment in old_segments)
+        new_text = old_text[:offset - span_start] + insert_text + old_text[end - span_start:]
+
+        new_segments = [Segment(self.spell_checker, piece) for piece in split_segments(new_text) if piece]
+        lengths = np.array([len(segment.text) for segment in new_segments], dtype=np.int64)
+        new_starts = span_start + np.concatenate(([0], np.cumsum(lengths)))[:-1]
+        delta = len(insert_text) - delete_len
+        self.segments[first:last + 1] = new_segments
+        self.starts = np.concatenate((self.starts[:first], new_starts, self.starts[last + 1:] + delta))
+        self.length += delta
+
+        # corrections of the replaced sentences, by (typo, left, right)
+        known = self._corrections(old_segments)
+        stop = first + len(new_segments)
+        for position in range(first, stop):
+            self._check_segment(position, known)
+        # neighbours whose context crosses into the re-checked sentences
+        neighbours = self._neighbours(first, stop)
+        for position in neighbours:
+            self._check_segment(position, self._corrections([self.segments[position]]))
+        return self._typo_dicts(min([first] + neighbours), max([stop] + [position + 1 for position in neighbours]))
+
+    def _corrections(self, segments):
+        corrections = {}
+        for segment in segments:
+            for index, (left, right, correction) in segment.typos.items():
+                corrections[(segment.tokens[index], left, right)] = correction
+        return corrections
+
+    def _neighbours(self, first, stop):
+        spell_checker = self.spell_checker
+        history = max(spell_checker.lm.order - 1, 0)
+        positions = []
+        for reach, step, position in ((history, 1, stop), (spell_checker.right_context, -1, first - 1)):
+            while reach > 0 and 0 <= position < len(self.segments):
+                segment = self.segments[position]
+                if segment.typos:
+                    positions.append(position)
+                reach -= len(segment.tokens)
+                position += step
+        return positions
+
+    def _context_tokens(self, position, count, step):
+        '''
+        up to 'count' tokens before (step -1) or after (step 1) sentence 'position'
+        '''
+        tokens = []
+        position += step
+        while len(tokens) < count and 0 <= position < len(self.segments):
+            segment_tokens = self.segments[position].tokens
+            tokens = segment_tokens[-(count - len(tokens)):] + tokens if step < 0 else tokens + segment_tokens[:count - len(tokens)]
+            position += step
+        return tokens
+
+    def _check_segment(self, position, known):
+        '''
+        correct the typos of sentence 'position', taking the correction of a
+        typo seen in the same context from 'known' instead of scoring it
+        '''
+        spell_checker = self.spell_checker
+        segment = self.segments[position]
+        typo_indices = [index for index, is_typo in enumerate(segment.is_typo) if is_typo]
+        if not typo_indices:
+            segment.typos = {}
+            return
+        history = max(spell_checker.lm.order - 1, 0)
+        before = self._context_tokens(position, history, -1)
+        after = self._context_tokens(position, spell_checker.right_context, 1)
+        tokens = before + segment.tokens + after
+
+        typos = {}
+        if spell_checker.decoder == 'beam':
+            window = before + segment.tokens
+            corrections = spell_checker.beam_decoder.decode(window, [len(before) + index for index in typo_indices])
+            for index in typo_indices:
+                # jointly decoded, no context of its own to be reused in
+                typos[index] = (None, None, corrections[len(before) + index])
+        else:
+            for index in typo_indices:
+                at = len(before) + index
+                left = tuple(tokens[max(at - history, 0):at])
+                right = tuple(tokens[at + 1:at + 1 + spell_checker.right_context])
+                token = segment.tokens[index]
+                correction = known.get((token, left, right))
+                if correction is None:
+                    correction = spell_checker.correct_context(token, left, right, 0)[0]
+                typos[index] = (left, right, correction)
+        segment.typos = typos
+
+    def _typo_dicts(self, first, stop):
+        typo_list = []
+        for position in range(first, stop):
+            segment = self.segments[position]
+            start = int(self.starts[position])
+            for index in sorted(segment.typos):
+                token_start, token_end = segment.spans[index]
+                typo_list.append({'typo': segment.tokens[index],
+                                  'correction': segment.typos[index][2],
+                                  'start': start + token_start,
+                                  'end': start + token_end,
+                                  'length': token_end - token_start})
+        return typo_list
+
+    def typos(self):
+        '''
+        the typo dicts of the whole document, as check(self.text) returns them
+        '''
+        return self._typo_dicts(0, len(self.segments))
@@ -0,0 +1,278 @@
+# !/usr/bin/env python3
+# -*- coding:utf-8 -*-
+# @author: Shengjia Yan
+# @date: 2026-10-18 Sunday
+# @email: i@yanshengjia.com
+# Copyright @ Shengjia Yan. All Rights Reserved.
+
+
+import os
+import sys
+import json
+import itertools
+import codecs
+import multiprocessing
+from collections.abc import Mapping
+from multiprocessing import shared_memory, resource_tracker
+from time import time
+
+import numpy as np
+from binary_lm import lm_sections, section_layout, read_sections, read_lm
+from packed_lm import PackedLM
+from vocabulary import load_vocabulary
+
+import logging
+logger = logging.getLogger('shared_model')
+
+
+class SharedVocabulary(Mapping):
+    '''
+    read-only {word: count} over a sorted fixed-width bytes array and a
+    counts array, both numpy views of a shared buffer: membership is a
+    binary search, nothing is copied into the process
+    '''
+    def __init__(self, words, counts):
+        self.words = words
+        self.counts = counts
+
+    @staticmethod
+    def sections(word_dict):
+        '''
+        the named arrays of 'word_dict' stored by SharedModel.publish
+        '''
+        encoded = sorted(word.encode('utf8') for word in word_dict)
+        width = max([len(word) for word in encoded] + [1])
+        words = np.array(encoded, dtype='S{}'.format(width))
+        counts = np.array([word_dict[word.decode('utf8')] for word in encoded], dtype=np.int64)
+        return [('dict_words', words), ('dict_counts', counts)]
+
+    def _position(self, word):
+        if not isinstance(word, str):
+            return -1
+        encoded = word.encode('utf8')
+        if not encoded or len(encoded) > self.words.dtype.itemsize:
+            return -1
+        position = int(np.searchsorted(self.words, encoded))
+        if position < len(self.words) and self.words[position] == encoded:
+            return position
+        return -1
+
+    def __contains__(self, word):
+        return self._position(word) >= 0
+
+    def known(self, words, batch_size=4096):
+        '''
+        the set of 'words' in the vocabulary, one vectorised search per
+        'batch_size' words instead of one per word. 'words' is read in
+        batches, so an edits2 generator is never held whole in memory
+        '''
+        found_words = set()
+        if not len(self.words):
+            return found_words
+        words = iter(words)
+        while True:
+            batch = list(set(itertools.islice(words, batch_size)))
+            if not batch:
+                return found_words
+            encoded = np.array([word.encode('utf8') for word in batch])
+            positions = np.minimum(np.searchsorted(self.words, encoded), len(self.words) - 1)
+            found = self.words[positions] == encoded
+            found_words.update(word for word, is_known in zip(batch, found.tolist()) if is_known)
+
+    def __getitem__(self, word):
+        position = self._position(word)
+        if position < 0:
+            raise KeyError(word)
+        return int(self.counts[position])
+
+    def __iter__(self):
+        for word in self.words:
+            yield word.decode('utf8')
+
+    def __len__(self):
+        return len(self.words)
+
+
+class _Block(shared_memory.SharedMemory):
+    def __del__(self):
+        try:
+            self.close()
+        except BufferError:
+            pass    # exiting with the model still in use, the mapping goes with the process
+
+
+def _attach_block(name):
+    try:
+        return _Block(name=name, track=False)     # Python 3.13+
+    except TypeError:
+        pass
+    # earlier versions register the block of every process with the resource
+    # tracker, which unlinks it when that process exits
+    register = resource_tracker.register
+    resource_tracker.register = lambda name, rtype: None
+    try:
+        return _Block(name=name)
+    finally:
+        resource_tracker.register = register
+
+
+class SharedModel:
+    '''
+    language model and vocabulary of a SpellChecker in one block of shared
+    memory, for worker processes that would each load their own copy
+
+    the parent publish()es them once, every worker attach()es the block by
+    its name and reads the tables through zero-copy numpy views (the
+    lm.bin layout, see binary_lm.write_sections), so N workers hold one
+    copy of the model whatever their start method. the publisher unlink()s
+    the block when the workers are done, a process close()s its own mapping
+    once nothing uses its lm and word_dict any more
+    '''
+    def __init__(self, block, owner=False):
+        self.block = block
+        self.owner = owner
+        sections = read_sections(block.buf)
+        self.lm = read_lm(block.buf)
+        self.word_dict = SharedVocabulary(sections['dict_words'], sections['dict_counts'])
+
+    @property
+    def name(self):
+        return self.block.name
+
+    @classmethod
+    def publish(cls, lm, word_dict, name=None):
+        '''
+        copy 'lm' (a PackedLM) and 'word_dict' into a new shared memory block
+        '''
+        logger.info('Publishing language model and vocabulary in shared memory...')
+        t0 = time()
+        sections = lm_sections(lm) + SharedVocabulary.sections(word_dict)
+        header, directory, size = section_layout(sections)
+        block = _Block(name=name, create=True, size=size)
+        block.buf[:len(header)] = header
+        for section_name, values in sections:
+            offset, dtype, count = directory[section_name]
+            np.frombuffer(block.buf, dtype=np.dtype(dtype), count=count, offset=offset)[:] = values
+        logger.info("   {:.1f}MB in {} in {:.3f}s".format(size / 1024.0 / 1024.0, block.name, time() - t0))
+        return cls(block, owner=True)
+
+    @classmethod
+    def attach(cls, name):
+        '''
+        the model published under 'name' by another process
+        '''
+        return cls(_attach_block(name))
+
+    def close(self):
+        '''
+        unmap the block, raises BufferError while an lm or word_dict taken
+        from this model is still referenced
+        '''
+        self.lm = None
+        self.word_dict = None
+        self.block.close()
+
+    def unlink(self):
+        if self.owner:
+            self.block.unlink()
+
+
+def private_mb():
+    '''
+    memory of this process no other process maps (USS: private clean and
+    dirty pages), None where /proc/self/smaps_rollup is missing. unlike RSS
+    it does not count the shared pages a worker reads
+    '''
+    try:
+        with open('/proc/self/smaps_rollup') as smaps:
+            fields = dict(line.split(':', 1) for line in smaps if ':' in line)
+    except OSError:
+        return None
+    return sum(int(fields[name].split()[0]) for name in ('Private_Clean', 'Private_Dirty')) / 1024.0
+
+
+def _use_model(lm, word_dict):
+    # read all of it: every n-gram table, every unigram score, every word
+    touched = 0.0
+    for k in range(lm.order):
+        touched += float(np.nansum(lm.log_p[k])) + float(np.sum(lm.log_bw[k]))
+        if lm.keys[k] is not None and len(lm.keys[k]):
+            touched += float(lm.keys[k].max())
+    lm.score_batch(lm.context_state(()), np.arange(len(lm.vocab)))
+    return touched + sum(1 for word in word_dict if word in word_dict)
+
+
+def _measure_worker(name, checker_kwargs, sentences, results):
+    # what a worker of check_stream or of the server does, see spell._init_worker
+    from spell import SpellChecker      # spell imports this module
+    before = private_mb()
+    spell_checker = SpellChecker(shared_model=name, **checker_kwargs).warmup()
+    _use_model(spell_checker.lm, spell_checker.word_dict)
+    for sentence in sentences:
+        spell_checker.check(sentence)
+    results.put((os.getpid(), private_mb() - before))
+
+
+def _load_sentences(testset_path, size):
+    sentences = []
+    with codecs.open(testset_path, mode='r', encoding='utf8') as testset:
+        for line in testset:
+            if line.strip():
+                sentences.extend(sentence_dict['SENT'] for sentence_dict in json.loads(line)['ERRORSENTS'])
+            if len(sentences) >= size:
+                break
+    return sentences[:size]
+
+
+def main(workers=4, max_growth_mb=4.0, sentence_number=200):
+    '''
+    private memory growth of 'workers' fresh (spawned) processes set up as
+    the workers of check_stream and of the server are, SpellChecker(
+    shared_model=name).warmup(), then checking 'sentence_number' sentences
+    of the test set, against workers loading their own lm.json and
+    vocabulary. returns 1 (the exit status) when a shared model worker
+    without candidate or fallback index grew by more than 'max_growth_mb',
+    0 otherwise. the limit leaves room for the bounded caches of the checker,
+    not for a copy of the vocabulary
+
+    those indexes (symspell, trie, q-gram, phonetic) are built by every
+    worker from the shared vocabulary, their growth is logged apart
+    '''
+    logging.basicConfig(level=logging.INFO, format='[%(levelname)s] (%(asctime)s) (%(name)s) %(message)s')
+    if private_mb() is None:
+        logger.warning('/proc/self/smaps_rollup not available, cannot measure private memory')
+        return 0
+    lm_path, corpus_path = '../data/lm/lm.json', '../data/corpus/corpus.txt'
+    sentences = _load_sentences('../data/testset/ielts.json', sentence_number)
+    with codecs.open(lm_path, mode='r', encoding='utf8') as lm_json:
+        lm = PackedLM.from_dict(json.load(lm_json))
+    model = SharedModel.publish(lm, load_vocabulary(corpus_path))
+    context = multiprocessing.get_context('spawn')
+    no_index = {'candidate_engine': 'edits', 'qgram_fallback': False, 'phonetic_fallback': False}
+    growths = {}
+    try:
+        for label, name, checker_kwargs in (('private copy', None, no_index),
+                                            ('shared model', model.name, no_index),
+                                            ('shared model, default indexes', model.name, {})):
+            results = context.Queue()
+            processes = [context.Process(target=_measure_worker, args=(name, checker_kwargs, sentences, results))
+                         for _ in range(workers)]
+            for process in processes:
+                process.start()
+            growths[label] = [results.get()[1] for _ in processes]
+            for process in processes:
+                process.join()
+            logger.info('[{}] private memory growth per worker: {} MB'.format(
+                label, ', '.join('{:.2f}'.format(growth) for growth in growths[label])))
+    finally:
+        model.close()
+        model.unlink()
+    worst = max(growths['shared model'])
+    if worst > max_growth_mb:
+        logger.error('a worker of the shared model grew by {:.2f}MB, more than {:.2f}MB'.format(worst, max_growth_mb))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(int(sys.argv[1]) if len(sys.argv) > 1 else 4))
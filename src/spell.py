@@ -6,76 +6,384 @@
 # Copyright @ Shengjia Yan. All Rights Reserved.
 
 
+import os
 import re
+import sys
 import json
-import nltk
+import argparse
 import codecs
+import heapq
 import string
-from collections import Counter
+import itertools
+import multiprocessing
+import numpy as np
+from collections import deque, namedtuple
 from time import time
-from nltk.tokenize.treebank import TreebankWordTokenizer
+from symspell import SymSpellIndex
+from trie import TrieIndex
+from decoder import BeamDecoder
+from error_model import ErrorModel, ChannelIndex
+from phonetic import PhoneticIndex
+from qgram import QGramIndex
+from edit_distance import damerau_levenshtein
+from session import DocumentSession
+from shared_model import SharedModel
+from packed_lm import PackedLM
+from binary_lm import open_lm
+from cache import LRUCache
+from instrumentation import Instrumentation
+from vocabulary import load_vocabulary, vocabulary_path, read_vocabulary_meta
 
 import logging
-logging.basicConfig(
-        level=logging.INFO,
-        format='[%(levelname)s] (%(asctime)s) (%(name)s) %(message)s',
-        handlers=[
-            logging.FileHandler('../data/log/spell.log', encoding='utf8'),
-            logging.StreamHandler()
-        ])
 logger = logging.getLogger('spell')
 
 
+PUNCTUATION = frozenset(string.punctuation)
+
+# single pass word tokenizer, splits like the Treebank tokenizer on the common
+# cases (n't / 's clitics, punctuation, numbers, dotted abbreviations) but
+# never rewrites the text, so match offsets are the token offsets
+TOKEN_PATTERN = re.compile(r'''
+    \w+(?=n['’]t\b)                               # do|n't, ca|n't
+  | n['’]t\b
+  | ['’](?:s|m|d|ll|re|ve)\b                       # 's 'm 'd 'll 're 've
+  | \bcan(?=not\b)                                # can|not
+  | (?:[^\W\d_]\.){2,}                             # dotted abbreviations: U.S. e.g.
+  | \d+(?:[.,:]\d+)*(?!\w)                         # numbers: 3.14 1,000 10:30
+  | \w+(?:-\w+|['’](?!(?:s|m|d|ll|re|ve|t)\b)\w+)*  # words, hyphenated words, o'clock
+  | \.\.\.|--
+  | \S                                             # any other symbol
+''', re.VERBOSE | re.IGNORECASE)
+
+Token = namedtuple('Token', ['index', 'token', 'start', 'end', 'length'])
+CANDIDATE_ENGINES = ('edits', 'symspell', 'trie', 'channel')
+LM_FORMATS = ('json', 'binary')
+DECODERS = ('greedy', 'beam')
+INPUT_FORMATS = ('auto', 'text', 'jsonl')
+
+
 class SpellChecker:
-    def __init__(self):
+    def __init__(self, candidate_engine='edits', max_edit_distance=2, lm_format='json',
+                 cache_size=10000, cache_policy='lru', right_context=0, decoder='greedy', beam_width=8,
+                 phonetic_fallback=True, qgram_fallback=True, shared_model=None):
+        if lm_format not in LM_FORMATS:
+            raise ValueError('unknown language model format: {}'.format(lm_format))
+        if decoder not in DECODERS:
+            raise ValueError('unknown decoder: {}'.format(decoder))
+        # how pool workers rebuild this checker when they cannot fork it
+        self.init_kwargs = {'candidate_engine': candidate_engine,
+                            'max_edit_distance': max_edit_distance,
+                            'lm_format': lm_format,
+                            'cache_size': cache_size,
+                            'cache_policy': cache_policy,
+                            'right_context': right_context,
+                            'decoder': decoder,
+                            'beam_width': beam_width,
+                            'phonetic_fallback': phonetic_fallback,
+                            'qgram_fallback': qgram_fallback,
+                            'shared_model': shared_model}
         self.corpus_path = '../data/corpus/corpus.txt'
-        self.lm_path = '../data/lm/lm.json'
-        self.lm = self.load_lm()
-        self.word_dict = Counter(self.words(open(self.corpus_path).read()))
-        self._word_tokenizer = TreebankWordTokenizer()
+        self.lm_format = lm_format
+        self.lm_path = '../data/lm/lm.bin' if lm_format == 'binary' else '../data/lm/lm.json'
+        # the model and the indexes are loaded on first use (see the
+        # properties below), or all at once by warmup()
+        self._lm = None
+        self._word_dict = None
+        self._known_tokens = None
+        self._candidate_index = None
+        self._error_model = None
+        self._qgram_index = None
+        self._phonetic_index = None
+        if shared_model is not None:
+            # published by another process, see publish_model
+            self.shared_model = SharedModel.attach(shared_model)
+            self._lm, self._word_dict = self.shared_model.lm, self.shared_model.word_dict
+        else:
+            self.shared_model = None
+        self.max_edit_distance = max_edit_distance
+        self.right_context = right_context     # following words also scored given the candidate
+        self.candidate_cache = LRUCache(cache_size, cache_policy)      # typo -> candidates
+        self.correction_cache = LRUCache(cache_size, cache_policy)     # (typo, left, right, k) -> correction, rank
+        self.candidate_cache_path = '../data/cache/candidates.json'
+        # (word, typo) pairs the 'channel' engine learns its error model from
+        self.error_model_paths = ['../data/testset/spell_testset1.txt', '../data/testset/spell_testset2.txt']
+        # 'greedy' corrects each typo given the uncorrected words around it,
+        # 'beam' corrects all the typos of a sentence jointly, see decoder.py
+        self.decoder = decoder
+        self.beam_decoder = BeamDecoder(self, beam_width)
+        self.instrumentation = None
+        # fallback tiers for the typos with a letter the engine finds no
+        # candidate for, consulted together: words one edit further away
+        # and sound-alike words
+        self.fallback_distance = max_edit_distance + 1
+        self.qgram_fallback = qgram_fallback
+        self.phonetic_fallback = phonetic_fallback
+        self.set_candidate_engine(candidate_engine)
+
+    @property
+    def lm(self):
+        if self._lm is None:
+            self._lm = self.load_lm()
+        return self._lm
+
+    @property
+    def word_dict(self):
+        if self._word_dict is None:
+            # counted once and saved next to the corpus, see vocabulary.py
+            self._word_dict = load_vocabulary(self.corpus_path)
+        return self._word_dict
+
+    @property
+    def known_tokens(self):
+        if self._known_tokens is None:
+            self._known_tokens = self.build_known_tokens()
+        return self._known_tokens
+
+    @property
+    def candidate_index(self):
+        if self._candidate_index is None and self.candidate_engine != 'edits':
+            self._candidate_index = self.build_candidate_index()
+        return self._candidate_index
+
+    @property
+    def error_model(self):
+        if self._error_model is None and self.candidate_engine == 'channel':
+            self._error_model = ErrorModel.from_testsets(self.error_model_paths)
+        return self._error_model
+
+    @property
+    def qgram_index(self):
+        if self._qgram_index is None and self.qgram_fallback:
+            self._qgram_index = self.build_qgram_index()
+        return self._qgram_index
+
+    @qgram_index.setter
+    def qgram_index(self, qgram_index):
+        # None turns the tier off, the cached candidates may change with it
+        self._qgram_index = qgram_index
+        self.qgram_fallback = qgram_index is not None
+        self.candidate_cache.clear()
+        self.correction_cache.clear()
+
+    @property
+    def phonetic_index(self):
+        if self._phonetic_index is None and self.phonetic_fallback:
+            self._phonetic_index = self.build_phonetic_index()
+        return self._phonetic_index
+
+    @phonetic_index.setter
+    def phonetic_index(self, phonetic_index):
+        self._phonetic_index = phonetic_index
+        self.phonetic_fallback = phonetic_index is not None
+        self.candidate_cache.clear()
+        self.correction_cache.clear()
+
+    def warmup(self):
+        '''
+        load the language model, the vocabulary and the indexes now instead
+        of on first use: for servers, so that the first requests do not pay
+        for them, and before forking workers, which then share them
+        '''
+        logger.info('Warming up...')
+        t0 = time()
+        for name in ('lm', 'known_tokens', 'candidate_index', 'error_model', 'qgram_index', 'phonetic_index'):
+            if name == 'known_tokens' and self.shared_model is not None:
+                continue    # detection reads the shared vocabulary, see _detect_shared
+            getattr(self, name)
+        logger.info("   Done in {:.3f}s".format(time() - t0))
+        return self
 
     def load_lm(self):
         logger.info('Loading n-grams language model...')
         t0 = time()
-        with codecs.open(self.lm_path, mode='r', encoding='utf8') as lm_json:
-            lm = json.load(lm_json)
+        if self.lm_format == 'binary':
+            # memory-mapped, see binary_lm.compile_lm for building lm.bin
+            lm = open_lm(self.lm_path)
+        else:
+            with codecs.open(self.lm_path, mode='r', encoding='utf8') as lm_json:
+                lm = PackedLM.from_dict(json.load(lm_json))
         logger.info("   Done in {:.3f}s".format(time() - t0))
         return lm
 
+    def publish_model(self, name=None):
+        '''
+        move the language model and the vocabulary of this checker into
+        shared memory: the workers of check_stream and of the server then
+        read this one copy instead of loading their own, see shared_model.py.
+        candidate and fallback indexes are still built by every worker. the
+        caller unlink()s the returned SharedModel once they are done
+        '''
+        instrumentation = self.instrumentation
+        self.uninstrument()
+        self.shared_model = SharedModel.publish(self.lm, self.word_dict, name)
+        self._lm, self._word_dict = self.shared_model.lm, self.shared_model.word_dict
+        self._known_tokens = None   # detection reads the shared vocabulary, see _detect_shared
+        self.init_kwargs['shared_model'] = self.shared_model.name
+        if instrumentation is not None:
+            self.instrument(instrumentation)
+        return self.shared_model
+
     def get_dict_size(self):
         unique_word_number = len(self.word_dict)
         return unique_word_number
 
+    def build_known_tokens(self):
+        '''
+        every token detect() accepts with a single set probe: dictionary
+        words, their Capitalized and UPPER forms and punctuation marks
+        '''
+        known_tokens = set(self.word_dict)
+        for word in self.word_dict:
+            for variant in (word.capitalize(), word.upper()):
+                if variant.lower() == word:
+                    known_tokens.add(variant)
+        known_tokens.update(PUNCTUATION)
+        return frozenset(known_tokens)
+
+    def build_qgram_index(self):
+        logger.info('Building character bigram index...')
+        t0 = time()
+        qgram_index = QGramIndex(self.word_dict)
+        logger.info("   Done in {:.3f}s".format(time() - t0))
+        return qgram_index
+
+    def build_phonetic_index(self):
+        logger.info('Building phonetic index...')
+        t0 = time()
+        phonetic_index = PhoneticIndex(self.word_dict)
+        logger.info("   Done in {:.3f}s".format(time() - t0))
+        return phonetic_index
+
+    def set_candidate_engine(self, engine):
+        '''
+        switch candidate generation between brute-force 'edits', the
+        precomputed 'symspell' delete index and the 'trie' Levenshtein walk,
+        all of them return the same candidates up to edit distance 2, or the
+        'channel' trie walk weighted by a learned error model, which returns
+        the most likely candidates only and adds their channel probability
+        to the ranking, see error_model.py
+        '''
+        if engine not in CANDIDATE_ENGINES:
+            raise ValueError('unknown candidate engine: {}'.format(engine))
+        if engine == 'edits' and self.max_edit_distance > 2:
+            raise ValueError('the edits engine only supports max_edit_distance <= 2')
+        # built on first use, see candidate_index
+        self._candidate_index = None
+        self._error_model = None
+        self.candidate_engine = engine
+        self.init_kwargs['candidate_engine'] = engine
+        self.candidate_cache.clear()
+        self.correction_cache.clear()
+
+    def build_candidate_index(self):
+        if self.candidate_engine == 'symspell':
+            logger.info('Building symmetric delete index...')
+            t0 = time()
+            candidate_index = SymSpellIndex(self.word_dict, self.max_edit_distance)
+            logger.info("   Done in {:.3f}s".format(time() - t0))
+        elif self.candidate_engine == 'trie':
+            logger.info('Building dictionary trie...')
+            t0 = time()
+            candidate_index = TrieIndex(self.word_dict)
+            logger.info("   Done in {:.3f}s".format(time() - t0))
+        elif self.candidate_engine == 'channel':
+            logger.info('Learning error model and building channel trie...')
+            t0 = time()
+            candidate_index = ChannelIndex(self.word_dict, self.error_model)
+            logger.info("   Done in {:.3f}s".format(time() - t0))
+        else:
+            candidate_index = None
+        return candidate_index
+
+    def instrument(self, instrumentation=None):
+        '''
+        start timing the stages of this checker and counting its events, see
+        instrumentation.py; returns the Instrumentation collecting them
+        '''
+        self.uninstrument()
+        self.instrumentation = (instrumentation or Instrumentation()).attach(self)
+        return self.instrumentation
+
+    def uninstrument(self):
+        if self.instrumentation is not None:
+            self.instrumentation.detach()
+            self.instrumentation = None
+
+    def cache_stats(self):
+        '''
+        size, hit, miss and eviction counters of the candidate and correction caches
+        '''
+        return {'candidates': self.candidate_cache.stats(),
+                'corrections': self.correction_cache.stats()}
+
+    def _cache_signature(self):
+        return {'engine': self.candidate_engine,
+                'max_edit_distance': self.max_edit_distance,
+                'qgram_fallback': self.qgram_fallback,
+                'phonetic_fallback': self.phonetic_fallback,
+                'dict_size': self.get_dict_size(),
+                'corpus_md5': self.corpus_md5()}
+
+    def corpus_md5(self):
+        '''
+        md5 of the corpus the dictionary was counted from, as saved with its
+        vocabulary, None without a saved vocabulary
+        '''
+        self.word_dict      # loading it rebuilds a saved vocabulary that is out of date
+        vocab_path = vocabulary_path(self.corpus_path)
+        if not os.path.exists(vocab_path):
+            return None
+        return read_vocabulary_meta(vocab_path).get('corpus_md5')
+
+    def save_candidate_cache(self, path=None):
+        '''
+        persist the candidate cache so that a later process can start warm
+        '''
+        path = path or self.candidate_cache_path
+        data = self._cache_signature()
+        data['candidates'] = [[typo, sorted(candidates)] for typo, candidates in self.candidate_cache.items()]
+        with codecs.open(path, mode='w', encoding='utf8') as cache_file:
+            json.dump(data, cache_file, ensure_ascii=False)
+        logger.info('{} cached candidate sets saved in {}'.format(len(data['candidates']), path))
+
+    def load_candidate_cache(self, path=None):
+        '''
+        reload a cache written by save_candidate_cache, ignored if it was built
+        with another engine, distance or dictionary
+        '''
+        path = path or self.candidate_cache_path
+        with codecs.open(path, mode='r', encoding='utf8') as cache_file:
+            data = json.load(cache_file)
+        candidates = data.pop('candidates')
+        if data != self._cache_signature():
+            logger.warning('Candidate cache {} does not match this checker, ignored'.format(path))
+            return
+        for typo, candidate_list in candidates:
+            self.candidate_cache.put(typo, frozenset(candidate_list))
+        logger.info('{} cached candidate sets loaded from {}'.format(len(candidates), path))
+
     def words(self, text):
         return re.findall(r'\w+', text.lower())
     
     def tokenize(self, text):
-        return self._word_tokenizer.tokenize(text)
+        return TOKEN_PATTERN.findall(text)
 
     def span_tokenize(self, text):
-        token_list = []     # [{'token': the, 'index': 0, 'start': 0, 'end': 6, 'length': 6}]
-        start = 0
-        index = 0
-        for word_token in self.tokenize(text):
-            token_dict = {}
-            start = text.find(word_token, start)
-            length = len(word_token)
-            end = start + length
-            token_dict['index']  = index
-            token_dict['start']  = start
-            token_dict['end']    = end
-            token_dict['length'] = length
-            token_dict['token']  = word_token
-            token_list.append(token_dict)
-            start = end
-            index += 1
-        return token_list
-    
+        '''
+        tokens of 'text' with their offsets, as Token records
+        [Token(index=0, token='the', start=0, end=3, length=3), ...]
+        '''
+        return [Token(index, match.group(), match.start(), match.end(), match.end() - match.start())
+                for index, match in enumerate(TOKEN_PATTERN.finditer(text))]
+
     def known(self, words):
         '''
         the subset of `words` that appear in the dictionary of WORDS
         '''
-        return set(w for w in words if w in self.word_dict)
+        word_dict = self.word_dict      # a property, looked up once and not per word
+        if self.shared_model is not None:
+            return word_dict.known(words)
+        return set(w for w in words if w in word_dict)
 
     def edits1(self, word):
         '''
@@ -106,114 +414,546 @@ class SpellChecker:
     
     def candidates(self, word):
         '''
-        generate possible spelling corrections for word
+        generate possible spelling corrections for word, a frozenset shared
+        with the candidate cache
         '''
-        return self.known([word]) or self.known(self.edits1(word)) or self.known(self.edits2(word))
+        candidates = self.candidate_cache.get(word)
+        if candidates is None:
+            candidates = frozenset(self._generate_candidates(word))
+            self.candidate_cache.put(word, candidates)
+        return candidates
+
+    def _generate_candidates(self, word):
+        candidates = self._engine_candidates(word)
+        if not candidates and any(char.isalpha() for char in word):
+            # the two tiers find different words ('imidatly' only sounds
+            # like 'immediately', 'necasery' is only 3 edits from
+            # 'necessary'), the language model ranks them together
+            if self.qgram_index is not None:
+                candidates = self.qgram_candidates(word)
+            if self.phonetic_index is not None:
+                candidates = candidates | self.phonetic_candidates(word)
+        return candidates
+
+    def _engine_candidates(self, word):
+        if self.candidate_index is None:
+            if self.max_edit_distance < 2:
+                return self.known([word]) or self.known(self.edits1(word))
+            return self.known([word]) or self.known(self.edits1(word)) or self.known(self.edits2(word))
+        if self.error_model is not None:
+            return self.known([word]) or set(self.candidate_index.search(word, self.max_edit_distance))
+        return self.known([word]) or self.nearest(self.candidate_index.search(word, self.max_edit_distance))
+
+    def _candidate_tiers(self, word):
+        '''
+        (distance, candidates) tiers of 'word', nearest first: candidates()
+        (cached), then the further tiers of the engine, each generated only
+        once the previous ones are consumed. the channel engine returns a
+        single tier, and so do the fallback tiers for the typos the engine
+        finds nothing for, at the distance of their farthest candidate
+        '''
+        nearest = self.candidates(word)
+        if not nearest:
+            return
+        distance = damerau_levenshtein(word, next(iter(nearest)), self.max_edit_distance)
+        if self.error_model is not None or distance > self.max_edit_distance:
+            yield max(damerau_levenshtein(word, candidate) for candidate in nearest), nearest
+            return
+        yield distance, nearest
+        seen = set(nearest)
+        for distance, tier in self._engine_tiers(word):
+            tier = tier - seen
+            if tier:
+                seen |= tier
+                yield distance, tier
+
+    def _engine_tiers(self, word):
+        if self.candidate_index is None:
+            edits = self.edits1(word)
+            yield 1, self.known(edits)
+            if self.max_edit_distance >= 2:
+                # not through edits2(), which counts the fallbacks of _engine_candidates
+                yield 2, self.known(e2 for e1 in edits for e2 in self.edits1(e1))
+        else:
+            matches = self.candidate_index.search(word, self.max_edit_distance)
+            for distance in sorted(set(matches.values())):
+                yield distance, set(w for w, d in matches.items() if d == distance)
+
+    def qgram_candidates(self, word):
+        '''
+        fallback tier for typos further than max_edit_distance from every
+        word: the closest dictionary words within fallback_distance edits,
+        and within a third of the length of 'word', as a short token is a
+        few edits away from nearly any short word. nothing for the words
+        too short to go further than the engine, see qgram.py
+        '''
+        max_distance = min(self.fallback_distance, len(word) // 3)
+        if max_distance <= self.max_edit_distance:
+            return set()
+        return _nearest(self.qgram_index.search(word, max_distance))
+
+    def phonetic_candidates(self, word):
+        '''
+        fallback tier for typos too far from every word for the candidate
+        engine ('exstacy' is 3 edits away from 'ecstasy'): the closest
+        dictionary words sharing its phonetic key, within half the length
+        of 'word' (a shared key is evidence of its own, so further than the
+        q-gram tier goes), see phonetic.py
+        '''
+        return _nearest(self.phonetic_index.search(word, max(1, len(word) // 2)))
+
+    def nearest(self, matches):
+        '''
+        the closest words of a {word: distance} search result
+        '''
+        return _nearest(matches)
 
     def probability(self, c, b, a):
         '''
-        ngrams (n up to 3) conditional probability of 'word' with backoff strategy
+        trigram conditional probability of 'word' with backoff strategy, see
+        score_context for longer contexts
         P(c | a b)
         a b c
         c: candidate, always in our word list
         a b: words before c, may or may not in our word list
         '''
-        abc = a + ' ' + b + ' ' + c
-        ab = a + ' ' + b
-        bc = b + ' ' + c
-
-        if abc in self.lm:
-            p = pow(10, float(self.lm[abc]['log_p']))
-        else:
-            if ab in self.lm:
-                if bc in self.lm:
-                    p = pow(10, float(self.lm[ab]['log_bw']) + float(self.lm[bc]['log_p']))
-                else:
-                    p = pow(10, float(self.lm[ab]['log_bw']) + float(self.lm[b]['log_bw']) + float(self.lm[c]['log_p']))
-            else:
-                if bc in self.lm:
-                    p = pow(10, float(self.lm[bc]['log_p']))
-                else:
-                    if b in self.lm:
-                        p = pow(10, float(self.lm[b]['log_bw']) + float(self.lm[c]['log_p']))
-                    else:
-                        p = pow(10, float(self.lm[c]['log_p']))
-        return p
+        return pow(10, self.lm.log_prob(c, b, a))
 
     def detect(self, word):
         '''
         return True if the word is a typo
         '''
-        if word in set(string.punctuation):
+        if self.shared_model is not None:
+            return self._detect_shared([word])[0]
+        if word in self.known_tokens:
             return False
+        return self._detect_unknown(word, self.known_tokens)
+
+    def detect_many(self, tokens):
+        '''
+        detect() for every token of a sentence in one call
+        '''
+        if self.shared_model is not None:
+            return self._detect_shared(tokens)
+        known_tokens = self.known_tokens
+        detect_unknown = self._detect_unknown
+        return [False if token in known_tokens else detect_unknown(token, known_tokens) for token in tokens]
+
+    def _detect_shared(self, tokens):
+        '''
+        detect_many() on the shared vocabulary, without the private known-token
+        set: the tokens, then the lowercase forms of the others, are looked up
+        in one vectorised search each
+        '''
+        word_dict = self.word_dict
+        known = word_dict.known(tokens)
+        known.update(PUNCTUATION)
+        known_lower = word_dict.known([token.lower() for token in tokens if token not in known])
+        detect_unknown = self._detect_unknown
+        return [False if token in known else detect_unknown(token, known_lower) for token in tokens]
+
+    def _detect_unknown(self, word, known_tokens):
+        '''
+        detect() for a token that is not a known word in its stored casing,
+        its lowercase form looked up in 'known_tokens'
+        '''
         if word.replace('.', '', 1).isdigit():
             return False
         if len(word) == 1 and word.isalpha():
             return False
-
-        if self.lookup(word) or self.lookup(word.lower()):
-            return False
-        else:
-            return True
+        return word.lower() not in known_tokens
     
-    def correct(self, word, pre1, pre2):
+    def score(self, candidates_list, pre1, pre2):
+        '''
+        backoff log10 probabilities of all candidates in the context 'pre2 pre1'
+        at once
+        '''
+        return self.score_context(candidates_list, (pre2, pre1))
+
+    def score_context(self, candidates_list, left, right=()):
+        '''
+        backoff log10 probabilities of all candidates after the words 'left'
+        (up to the order of the language model), plus those of the words
+        'right' following each candidate. candidates unknown to the language
+        model score as <unk>
+        '''
+        lm = self.lm
+        ids = lm.word_ids(candidates_list)
+        left_ids = tuple(lm.word_id(w) for w in left)
+        # the history is shared by all candidates, its backoff state is walked once
+        scores = lm.score_batch(lm.context_state(left_ids), ids)
+        # only the following words whose history still holds the candidate
+        right_ids = [lm.word_id(w) for w in right][:lm.order - 1]
+        if right_ids:
+            for position, candidate_id in enumerate(ids):
+                history = left_ids + (int(candidate_id),)
+                for word_id in right_ids:
+                    scores[position] += lm.score_state(lm.context_state(history), word_id)
+                    history += (word_id,)
+        return scores
+
+    def channel_costs(self, typo, candidates_list):
+        '''
+        -log10 P(typo | candidate) of the error model, zeros without one
+        '''
+        if self.error_model is None:
+            return np.zeros(len(candidates_list))
+        return np.array([self.error_model.distance(candidate, typo) for candidate in candidates_list])
+
+    def top_k(self, scores, k=None):
         '''
-        generate most probable spelling correction for typo 'word'
+        indices of the 'k' highest scores, best first, ties in input order
         '''
-        candidates_list = self.candidates(word)
-        correction_dict = {}
-        rank_list = []
+        if k is None or k >= len(scores):
+            return np.argsort(-scores, kind='stable')
+        if k <= 0:
+            return np.array([], dtype=np.int64)
+        # the k-th best score, then break ties at that score by position
+        threshold = scores[np.argpartition(-scores, k - 1)[k - 1]]
+        better = np.flatnonzero(scores > threshold)
+        tied = np.flatnonzero(scores == threshold)[:k - len(better)]
+        indices = np.concatenate([better, tied])
+        return indices[np.lexsort((indices, -scores[indices]))]
 
-        for candidate in candidates_list:
-            try:
-                p = self.probability(candidate, pre1, pre2)
-                correction_dict[candidate] = p
-            except:
-                correction_dict[candidate] = 0
+    def correct(self, word, pre1, pre2, k=None):
+        '''
+        generate most probable spelling correction for typo 'word', and the
+        ranking of the 'k' best candidates (all of them by default)
+        '''
+        return self.correct_context(word, (pre2, pre1), (), k)
+
+    def correct_context(self, word, left, right=(), k=None):
+        '''
+        correct() with the words 'left' before the typo and 'right' after it,
+        see score_context. k=0 skips the ranking and returns the correction
+        with an empty rank_list
+        '''
+        left = tuple(left)[-(self.lm.order - 1):] if self.lm.order > 1 else ()
+        right = tuple(right)[:self.lm.order - 1]
+        key = (word, left, right, k)
+        cached = self.correction_cache.get(key)
+        if cached is not None:
+            return cached[0], list(cached[1])
 
+        candidates_list = list(self.candidates(word))
         if not candidates_list:
-            correction = '<unk>'
+            correction, rank_list = '<unk>', []
         else:
-            correction = max(correction_dict, key=correction_dict.get)
-        correction_list = sorted(correction_dict.items(), key=lambda x: x[1], reverse=True)
-
-        for item in correction_list:
-            rank_list.append(item[0])
+            scores = self.score_context(candidates_list, left, right) - self.channel_costs(word, candidates_list)
+            correction = candidates_list[int(np.argmax(scores))]
+            rank_list = [candidates_list[i] for i in self.top_k(scores, k)] if k != 0 else []
+        self.correction_cache.put(key, (correction, tuple(rank_list)))
         return correction, rank_list
 
-    def check(self, sentence):
+    def suggest(self, word, context=(), k=5, right=()):
+        '''
+        the 'k' best corrections of 'word' after the words 'context' (and
+        before the words 'right'), as [(candidate, distance, score), ...]
+        best first, i.e. sorted by (distance, -score)
+
+        candidates rank by edit distance first, as in correct_context, then
+        by their score_context minus channel cost. 'distance' is the edit
+        distance of the tier of the candidate: the channel engine and the
+        fallback tiers give a single tier, at the distance of its farthest
+        candidate. the tiers are explored nearest first and only while there
+        are fewer than k suggestions: a further tier ranks below every
+        suggestion already taken, so once k are taken no remaining candidate
+        can enter and the further tiers (edits2 for the edits engine) are
+        never generated. within a tier a heap picks the best ones instead of
+        a full sort
+        '''
+        left = tuple(context)[-(self.lm.order - 1):] if self.lm.order > 1 else ()
+        right = tuple(right)[:self.lm.order - 1]
+        suggestions = []
+        if k <= 0:
+            return suggestions
+        for distance, tier in self._candidate_tiers(word):
+            candidates_list = list(tier)
+            scores = (self.score_context(candidates_list, left, right) - self.channel_costs(word, candidates_list)).tolist()
+            best = heapq.nlargest(k - len(suggestions), range(len(candidates_list)), key=scores.__getitem__)
+            suggestions.extend((candidates_list[i], distance, scores[i]) for i in best)
+            if len(suggestions) >= k:
+                break
+        return suggestions
+
+    def check(self, sentence, k=0):
+        '''
+        typo dicts of 'sentence', with the 'k' best candidates of every typo
+        under 'suggestions' when k > 0
+        '''
         token_list = self.span_tokenize(sentence)
+        tokens = [token_record.token for token_record in token_list]
+        typo_records = [token_record for token_record, is_typo in zip(token_list, self.detect_many(tokens)) if is_typo]
         typo_list  = []     # [{'typo': appll, 'correction': apple, 'start': 0, 'end': 5, 'offset': 5}]
+        if not typo_records:
+            return typo_list
 
-        for token_dict in token_list:
-            token = token_dict['token']
-            if self.detect(token):
-                index = token_dict['index']
-
-                if index == 0:
-                    pre1, pre2 = '', ''
-                elif index == 1:
-                    pre1, pre2 = token_list[index - 1]['token'], ''
-                else:
-                    pre1, pre2 = token_list[index - 1]['token'], token_list[index - 2]['token']
-
-                correction, rank_list = self.correct(token, pre1, pre2)
-
-                typo_dict = {}
-                typo_dict['typo'] = token
-                typo_dict['correction'] = correction
-                typo_dict['start'] = token_dict['start']
-                typo_dict['end'] = token_dict['end']
-                typo_dict['length'] = token_dict['length']
-                typo_list.append(typo_dict)
+        rankings = self.rank_greedy(tokens, typo_records, k) if k > 0 else None
+        if self.decoder == 'beam':
+            corrections = self.beam_decoder.decode(tokens, [token_record.index for token_record in typo_records])
+        elif rankings is not None:
+            corrections = dict((index, correction) for index, (correction, _) in rankings.items())
+        else:
+            corrections = self.correct_greedy(tokens, typo_records)
+
+        for token_record in typo_records:
+            typo_dict = {}
+            typo_dict['typo'] = token_record.token
+            typo_dict['correction'] = corrections[token_record.index]
+            typo_dict['start'] = token_record.start
+            typo_dict['end'] = token_record.end
+            typo_dict['length'] = token_record.length
+            if rankings is not None:
+                typo_dict['suggestions'] = rankings[token_record.index][1]
+            typo_list.append(typo_dict)
         return typo_list
 
+    def session(self, text=''):
+        '''
+        a DocumentSession of 'text' that edits re-check incrementally, see session.py
+        '''
+        return DocumentSession(self, text)
+
+    def correct_greedy(self, tokens, typo_records):
+        '''
+        {index: correction} of every typo taken alone, in the context of the
+        uncorrected tokens around it
+        '''
+        # the corrections only, no ranking
+        return dict((index, correction) for index, (correction, _) in self.rank_greedy(tokens, typo_records, 0).items())
+
+    def rank_greedy(self, tokens, typo_records, k=None):
+        '''
+        correct_greedy() with the ranking of the 'k' best candidates of every
+        typo: {index: (correction, rank_list)}
+        '''
+        history = max(self.lm.order - 1, 0)
+        rankings = {}
+        for token_record in typo_records:
+            index = token_record.index
+            left = tokens[max(index - history, 0):index]
+            right = tokens[index + 1:index + 1 + self.right_context]
+            rankings[index] = self.correct_context(token_record.token, left, right, k)
+        return rankings
+
+    def check_stream(self, documents, processes=None, chunk_size=16, max_in_flight=None, k=0):
+        '''
+        check an iterable of documents on a process pool and yield the typo
+        list of every document, in input order
+
+        documents are sent to the workers 'chunk_size' at a time and at most
+        'max_in_flight' chunks (2 per process by default) are pending, so
+        memory stays bounded however long the input is. workers are forked
+        from this process when the platform allows it and share its model,
+        warmed up before the fork, otherwise each one loads its own copy once.
+        'k' is passed on to check()
+        '''
+        global _worker_checker
+        if processes is None:
+            processes = multiprocessing.cpu_count()
+        if max_in_flight is None:
+            max_in_flight = 2 * processes
+        if processes <= 1:
+            for document in documents:
+                yield self.check(document, k)
+            return
+
+        if 'fork' in multiprocessing.get_all_start_methods():
+            context = multiprocessing.get_context('fork')
+            _worker_checker = self.warmup()
+        else:
+            context = multiprocessing.get_context()
+        pool = context.Pool(processes, initializer=_init_worker, initargs=(self.init_kwargs,))
+        try:
+            pending = deque()
+            for chunk in _chunks(documents, chunk_size):
+                pending.append(pool.apply_async(_check_chunk, (chunk, k)))
+                if len(pending) >= max_in_flight:
+                    for typo_list in pending.popleft().get():
+                        yield typo_list
+            while pending:
+                for typo_list in pending.popleft().get():
+                    yield typo_list
+        finally:
+            pool.terminate()
+            pool.join()
+            _worker_checker = None
+
+    def check_many(self, documents, processes=None, chunk_size=16):
+        '''
+        list of the typo lists of 'documents', see check_stream
+        '''
+        return list(self.check_stream(documents, processes, chunk_size))
+
+
+# the checker of a pool worker process, see SpellChecker.check_stream
+_worker_checker = None
+
+
+def _nearest(matches):
+    if not matches:
+        return set()
+    distance = min(matches.values())
+    return set(w for w, d in matches.items() if d == distance)
+
+
+def _init_worker(init_kwargs):
+    global _worker_checker
+    if _worker_checker is None:
+        _worker_checker = SpellChecker(**init_kwargs).warmup()
+
+
+def _check_chunk(documents, k=0):
+    return [_worker_checker.check(document, k) for document in documents]
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def setup_logging(log_path='../data/log/spell.log'):
+    '''
+    log to the console (stderr) and to 'log_path' unless it is None, called
+    by the scripts rather than at import so that importing spell neither
+    needs ../data/log nor takes over the logging of the importer
+    '''
+    handlers = [logging.StreamHandler()]
+    if log_path is not None:
+        handlers.insert(0, logging.FileHandler(log_path, encoding='utf8'))
+    logging.basicConfig(
+        level=logging.INFO,
+        format='[%(levelname)s] (%(asctime)s) (%(name)s) %(message)s',
+        handlers=handlers)
+
+
+def input_files(paths):
+    '''
+    the files of 'paths', directories walked in name order, '-' for stdin
+    '''
+    for path in paths:
+        if path != '-' and os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs[:] = sorted(name for name in dirs if not name.startswith('.'))
+                for name in sorted(files):
+                    if not name.startswith('.'):
+                        yield os.path.join(root, name)
+        else:
+            yield path
+
+
+def parse_line(line, is_jsonl, text_field='text'):
+    '''
+    (fields, text) of an input line, see read_documents. raises ValueError
+    on a line that is not valid UTF-8 or not a JSON object holding a string
+    under 'text_field'
+    '''
+    line = line.decode('utf8').rstrip('\r\n')
+    if not is_jsonl:
+        return {}, line
+    fields = json.loads(line)
+    if not isinstance(fields, dict):
+        raise ValueError('not a JSON object')
+    text = fields.pop(text_field, None)
+    if not isinstance(text, str):
+        raise ValueError('no string field {!r}'.format(text_field))
+    return fields, text
+
+
+def read_documents(paths, input_format='auto', text_field='text'):
+    '''
+    (record, text) of every non-blank line of 'paths', one line at a time:
+    a line is the text itself, or with the 'jsonl' format (the 'auto'
+    default for *.jsonl files) a JSON object holding it under 'text_field'.
+    record is what the output line of the document starts from: its source
+    and line number, and the other fields of a JSON line
+
+    a line that cannot be read is logged and yielded as a record with an
+    'error' and an empty text, and so is a file that cannot be opened (line
+    None), so that the output keeps one line per input line
+    '''
+    for path in input_files(paths):
+        is_jsonl = input_format == 'jsonl' or input_format == 'auto' and path.endswith('.jsonl')
+        source = '<stdin>' if path == '-' else path
+        try:
+            lines = sys.stdin.buffer if path == '-' else open(path, mode='rb')
+        except OSError as error:
+            logger.error('{}: {}'.format(source, error))
+            yield {'source': source, 'line': None, 'error': str(error)}, ''
+            continue
+        try:
+            for line_number, line in enumerate(lines, 1):
+                if not line.strip():
+                    continue
+                record = {'source': source, 'line': line_number}
+                try:
+                    fields, text = parse_line(line, is_jsonl, text_field)
+                except ValueError as error:     # UnicodeDecodeError and JSONDecodeError included
+                    logger.error('{}:{}: {}'.format(source, line_number, error))
+                    record['error'] = str(error)
+                    yield record, ''
+                    continue
+                record.update(fields)
+                yield record, text
+        finally:
+            if lines is not sys.stdin.buffer:
+                lines.close()
+
 
 def main():
-    speller = SpellChecker()
-    dict_size = speller.get_dict_size()
-    print(dict_size)
+    parser = argparse.ArgumentParser(description='spell check text or JSONL files line by line, one JSON line of typos per input line')
+    parser.add_argument('paths', nargs='*', default=['-'], help='files or directories, - or nothing for stdin')
+    parser.add_argument('--format', default='auto', choices=INPUT_FORMATS, help='auto: jsonl for *.jsonl files, text otherwise')
+    parser.add_argument('--text-field', default='text', help='field of a JSON line holding its text')
+    parser.add_argument('--output', default='-', help='JSONL output file, - for stdout')
+    parser.add_argument('--workers', type=int, default=None, help='checking processes, 1 checks in this one')
+    parser.add_argument('--batch-size', type=int, default=16, help='lines sent to a worker at a time')
+    parser.add_argument('--top-k', type=int, default=0, help='best candidates listed for every typo')
+    parser.add_argument('--lm-format', default='binary', choices=LM_FORMATS)
+    parser.add_argument('--candidate-engine', default='edits', choices=CANDIDATE_ENGINES)
+    parser.add_argument('--decoder', default='greedy', choices=DECODERS)
+    parser.add_argument('--log-file', default='../data/log/spell.log', help='empty for no log file')
+    args = parser.parse_args()
+    if args.batch_size < 1:
+        parser.error('--batch-size must be at least 1')
+    setup_logging(args.log_file or None)
+
+    spell_checker = SpellChecker(candidate_engine=args.candidate_engine, lm_format=args.lm_format, decoder=args.decoder)
+    output = sys.stdout if args.output == '-' else codecs.open(args.output, mode='w', encoding='utf8')
+    # records of the documents handed to check_stream and not written yet,
+    # as many as it keeps in flight
+    records = deque()
+    counters = {'documents': 0, 'words': 0, 'errors': 0}
+
+    def texts():
+        for record, text in read_documents(args.paths, args.format, args.text_field):
+            records.append(record)
+            counters['documents'] += 1
+            counters['errors'] += 'error' in record
+            counters['words'] += len(text.split())
+            yield text
+
+    typo_sum = 0
+    t0 = time()
+    try:
+        for typo_list in spell_checker.check_stream(texts(), args.workers, args.batch_size, k=args.top_k):
+            record = records.popleft()
+            if 'error' not in record:
+                record['typos'] = typo_list
+            typo_sum += len(typo_list)
+            output.write(json.dumps(record, ensure_ascii=False) + '\n')
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    elapsed = max(time() - t0, 1e-9)
+    logger.info('{} documents ({} unreadable), {} words, {} typos in {:.3f}s: {:.1f} documents/s, {:.1f} words/s'.format(
+        counters['documents'], counters['errors'], counters['words'], typo_sum, elapsed,
+        counters['documents'] / elapsed, counters['words'] / elapsed))
+
 
 if __name__ == '__main__':
     main()
-
@@ -0,0 +1,61 @@
+# !/usr/bin/env python3
+# -*- coding:utf-8 -*-
+# @author: Shengjia Yan
+# @date: 2026-10-18 Sunday
+# @email: i@yanshengjia.com
+# Copyright @ Shengjia Yan. All Rights Reserved.
+
+
+from edit_distance import damerau_levenshtein
+
+
+class SymSpellIndex:
+    '''
+    symmetric delete index: every dictionary word is stored under all strings
+    obtained by deleting up to 'max_distance' of its characters, so a lookup
+    only has to probe the deletes of the query instead of expanding its whole
+    edit space
+    '''
+    def __init__(self, words, max_distance=2):
+        self.max_distance = max_distance
+        self.deletes = {}   # delete variant -> [word, ...]
+        for word in words:
+            for variant in self.delete_variants(word, max_distance):
+                bucket = self.deletes.get(variant)
+                if bucket is None:
+                    self.deletes[variant] = [word]
+                else:
+                    bucket.append(word)
+
+    def delete_variants(self, word, max_distance):
+        '''
+        all strings obtained by deleting up to 'max_distance' characters of 'word'
+        '''
+        variants = {word}
+        frontier = {word}
+        for _ in range(max_distance):
+            frontier = set(w[:i] + w[i + 1:] for w in frontier for i in range(len(w)))
+            variants |= frontier
+        return variants
+
+    def search(self, word, max_distance=None):
+        '''
+        dictionary words within 'max_distance' edits of 'word', as {word: distance}
+        '''
+        if max_distance is None:
+            max_distance = self.max_distance
+        if max_distance > self.max_distance:
+            raise ValueError('index was built for max_distance <= {}'.format(self.max_distance))
+
+        shortlist = set()
+        for variant in self.delete_variants(word, max_distance):
+            bucket = self.deletes.get(variant)
+            if bucket is not None:
+                shortlist.update(bucket)
+
+        matches = {}
+        for candidate in shortlist:
+            distance = damerau_levenshtein(word, candidate, max_distance)
+            if distance <= max_distance:
+                matches[candidate] = distance
+        return matches
@@ -0,0 +1,124 @@
+# !/usr/bin/env python3
+# -*- coding:utf-8 -*-
+# @author: Shengjia Yan
+# @date: 2026-10-18 Sunday
+# @email: i@yanshengjia.com
+# Copyright @ Shengjia Yan. All Rights Reserved.
+
+
+from edit_distance import insert_cost
+
+
+class TrieIndex:
+    '''
+    character trie over the dictionary, searched with a row-by-row
+    Damerau-Levenshtein walk that abandons a branch as soon as every cell of
+    its last row exceeds the distance bound
+
+    distances are the ones of edit_distance.damerau_levenshtein, so for
+    max_distance <= 2 the result matches the edits1/edits2 expansion
+    '''
+    def __init__(self, words):
+        self.root = {}
+        self.size = 0
+        for word in words:
+            node = self.root
+            for char in word:
+                child = node.get(char)
+                if child is None:
+                    child = node[char] = {}
+                node = child
+            if None not in node:
+                self.size += 1
+            node[None] = word   # end of word marker
+
+    def search(self, word, max_distance=2):
+        '''
+        dictionary words within 'max_distance' edits of 'word', as {word: distance}
+        '''
+        columns = len(word)
+        inf = columns + max_distance + 1
+        # table[i + 1] is the distance row after i characters of the trie path,
+        # its column j + 1 holds the distance to word[:j], column 0 and
+        # table[0] are sentinels; cells with |i - j| > max_distance stay inf
+        sentinel = [inf] * (columns + 2)
+        first = [inf] + [j if j <= max_distance else inf for j in range(columns + 1)]
+        walk = _Walk(word, max_distance, inf, [sentinel, first])
+        for char, child in self.root.items():
+            if char is not None:
+                walk.descend(child, char)
+        return walk.matches
+
+
+class _Walk:
+    '''
+    state of one TrieIndex.search, kept on the trie path while descending
+    '''
+    def __init__(self, word, max_distance, inf, table):
+        self.word = word
+        self.max_distance = max_distance
+        self.inf = inf
+        self.table = table
+        self.prefix = [0]       # prefix[i]: cost of inserting the first i path characters
+        self.path = []
+        self.last_row = {}      # char -> last row of the path where it occurred
+        self.matches = {}
+
+    def descend(self, node, char):
+        word = self.word
+        max_distance = self.max_distance
+        table = self.table
+        prefix = self.prefix
+        path = self.path
+        last_row = self.last_row
+
+        i = len(table) - 1          # 1-based row of 'char'
+        prev_row = table[i]
+        char_cost = insert_cost(char)
+        prefix.append(prefix[-1] + char_cost)
+        path.append(char)
+
+        columns = len(word)
+        low = max(1, i - max_distance)
+        high = min(columns, i + max_distance)
+        row = [self.inf] * (columns + 2)
+        if i <= max_distance:
+            row[1] = prefix[i]
+        row_min = row[1]
+        last_col = word.rfind(char, 0, low - 1) + 1
+        for j in range(low, high + 1):
+            word_char = word[j - 1]
+            cost = 0 if word_char == char else char_cost
+            value = min(prev_row[j] + cost,
+                        row[j] + 1,
+                        prev_row[j + 1] + char_cost)
+            i1 = last_row.get(word_char, 0)
+            if i1 and last_col:
+                transpose = table[i1][last_col] + prefix[i - 1] - prefix[i1] + 1 + (j - last_col - 1)
+                if transpose < value:
+                    value = transpose
+            if i > 2 and j > 2 and value > table[i - 2][j - 2] + 2:
+                rotated = word[j - 3:j]
+                window = path[i - 3] + path[i - 2] + char
+                if window == rotated[1:] + rotated[0] or window == rotated[2] + rotated[:2]:
+                    value = table[i - 2][j - 2] + 2
+            if cost == 0:
+                last_col = j
+            row[j + 1] = value
+            if value < row_min:
+                row_min = value
+
+        if row_min <= max_distance:
+            table.append(row)
+            if None in node and row[-1] <= max_distance:
+                self.matches[node[None]] = row[-1]
+            previous = last_row.get(char, 0)
+            last_row[char] = i
+            for next_char, child in node.items():
+                if next_char is not None:
+                    self.descend(child, next_char)
+            last_row[char] = previous
+            table.pop()
+
+        prefix.pop()
+        path.pop()
@@ -0,0 +1,140 @@
+# !/usr/bin/env python3
+# -*- coding:utf-8 -*-
+# @author: Shengjia Yan
+# @date: 2026-10-18 Sunday
+# @email: i@yanshengjia.com
+# Copyright @ Shengjia Yan. All Rights Reserved.
+
+
+import os
+import re
+import mmap
+import hashlib
+from time import time
+from collections import Counter
+
+import numpy as np
+from binary_lm import write_sections, read_sections
+
+import logging
+logger = logging.getLogger('vocabulary')
+
+
+# the word frequency table of a corpus, stored next to it as
+#   words   uint8, utf8 words in sorted order joined by '\n'
+#   counts  int64, frequency of every word
+# with the size, mtime and md5 of the corpus it was counted from
+WORD_PATTERN = re.compile(r'\w+')
+
+
+def vocabulary_path(corpus_path):
+    return corpus_path + '.vocab'
+
+
+def corpus_md5(corpus_path):
+    md5 = hashlib.md5()
+    with open(corpus_path, 'rb') as corpus_file:
+        for block in iter(lambda: corpus_file.read(1 << 20), b''):
+            md5.update(block)
+    return md5.hexdigest()
+
+
+def _corpus_stat(corpus_path):
+    stat = os.stat(corpus_path)
+    return {'corpus_size': stat.st_size, 'corpus_mtime_ns': stat.st_mtime_ns}
+
+
+def save_vocabulary(word_dict, output_path, meta):
+    '''
+    write 'word_dict' atomically, so concurrent readers never see a partial file
+    '''
+    words = sorted(word_dict)
+    blob = '\n'.join(words).encode('utf8')
+    sections = [('words', np.frombuffer(blob, dtype=np.uint8)),
+                ('counts', np.array([word_dict[word] for word in words], dtype=np.int64))]
+    temp_path = '{}.{}.tmp'.format(output_path, os.getpid())
+    write_sections(sections, temp_path, meta)
+    os.replace(temp_path, output_path)
+
+
+def build_vocabulary(corpus_path, output_path=None):
+    '''
+    count the words of 'corpus_path' (lowercased \\w+ runs, as
+    SpellChecker.words) and save the table, returns it as a Counter
+    '''
+    output_path = output_path or vocabulary_path(corpus_path)
+    logger.info('Building vocabulary of {}...'.format(corpus_path))
+    t0 = time()
+    meta = _corpus_stat(corpus_path)
+    md5 = hashlib.md5()
+    word_dict = Counter()
+    with open(corpus_path, 'rb') as corpus_file:
+        for line in corpus_file:
+            md5.update(line)
+            word_dict.update(WORD_PATTERN.findall(line.decode('utf8').lower()))
+    meta['corpus_md5'] = md5.hexdigest()
+    save_vocabulary(word_dict, output_path, meta)
+    logger.info("   {} words written to {} in {:.3f}s".format(len(word_dict), output_path, time() - t0))
+    return word_dict
+
+
+def read_vocabulary(vocab_path):
+    '''
+    (Counter, meta) of a saved vocabulary
+    '''
+    with open(vocab_path, 'rb') as vocab_file:
+        buffer = mmap.mmap(vocab_file.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        sections = read_sections(buffer)
+        blob = sections.pop('words').tobytes().decode('utf8')
+        counts = sections.pop('counts').tolist()
+    finally:
+        buffer.close()
+    words = blob.split('\n') if blob else []
+    return Counter(dict(zip(words, counts))), sections
+
+
+def read_vocabulary_meta(vocab_path):
+    '''
+    the meta values of a saved vocabulary (corpus size, mtime and md5),
+    without reading its words
+    '''
+    with open(vocab_path, 'rb') as vocab_file:
+        buffer = mmap.mmap(vocab_file.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        sections = read_sections(buffer)
+        meta = dict((name, value) for name, value in sections.items() if not isinstance(value, np.ndarray))
+        del sections    # views of the buffer
+    finally:
+        buffer.close()
+    return meta
+
+
+def load_vocabulary(corpus_path, vocab_path=None):
+    '''
+    word frequency table of 'corpus_path', read from its saved vocabulary
+    and rebuilt when the corpus checksum no longer matches. without the
+    corpus (a deployment shipping the saved vocabulary only) the saved
+    vocabulary is used as it is
+    '''
+    vocab_path = vocab_path or vocabulary_path(corpus_path)
+    if not os.path.exists(vocab_path):
+        return build_vocabulary(corpus_path, vocab_path)
+
+    logger.info('Loading vocabulary...')
+    t0 = time()
+    word_dict, meta = read_vocabulary(vocab_path)
+    if not os.path.exists(corpus_path):
+        logger.warning('   Corpus {} not found, {} is not checked against it'.format(corpus_path, vocab_path))
+        logger.info("   Done in {:.3f}s".format(time() - t0))
+        return word_dict
+    stat = _corpus_stat(corpus_path)
+    if any(meta.get(name) != value for name, value in stat.items()):
+        # touched or replaced: only the content decides
+        if meta.get('corpus_md5') != corpus_md5(corpus_path):
+            logger.info('   Corpus changed')
+            return build_vocabulary(corpus_path, vocab_path)
+        meta.update(stat)
+        save_vocabulary(word_dict, vocab_path, meta)
+    logger.info("   Done in {:.3f}s".format(time() - t0))
+    return word_dict
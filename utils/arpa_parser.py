@@ -4,56 +4,152 @@
 # @date: 2017-11-29 Wednesday
 # @email: i@yanshengjia.com
 
+import os
+import re
+import sys
+import argparse
+import gzip
 import json
 import codecs
+from time import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+from binary_lm import LMWriter
+
+import logging
+logger = logging.getLogger('arpa_parser')
+
 
 class ARPAParser:
-    def __init__(self, parent=None):
+    '''
+    streaming reader of ARPA n-gram language models of any order, plain or
+    gzipped; nothing but the current line is held in memory unless extract()
+    is asked for the whole model as a dict
+    '''
+    def __init__(self, parent=None, lm_path='../data/lm/corpus.lm'):
         self.parent = parent
-        self.n_max = 3
-        self.lm_path = '../data/lm/corpus.lm'
-        self.arpa_file = open(self.lm_path, 'r')
+        self.lm_path = lm_path
+        self.counts = {}        # order -> number of n-grams announced in \data\
+        self.n_max = 0
         self.info = ''
         self.lm = {}
         self.output_path = '../data/lm/lm.json'
+        self.binary_output_path = '../data/lm/lm.bin'
+        self.report_every = 1000000
+
+    def openARPA(self):
+        with open(self.lm_path, 'rb') as probe:
+            gzipped = probe.read(2) == b'\x1f\x8b'
+        if gzipped:
+            return gzip.open(self.lm_path, 'rt', encoding='utf8')
+        return codecs.open(self.lm_path, mode='r', encoding='utf8')
+
+    def iterNgrams(self):
+        '''
+        yield (order, ngram, log_p, log_bw) for every entry, log_bw is None
+        when the line has no backoff weight; logs progress and throughput and
+        warns when a section holds another number of n-grams than \\data\\
+        announced for its order
+        '''
+        t0 = time()
+        total = 0
+        read = 0        # n-grams of the current section
+        section = 0     # 0: before \data\, -1: in \data\, n: in \n-grams:
+        with self.openARPA() as arpa_file:
+            for line in arpa_file:
+                line = line.strip()
+                if not line:
+                    continue
+                if line.startswith('\\'):
+                    if section > 0:
+                        self._end_section(section, read, total, t0)
+                    if line == '\\data\\':
+                        section = -1
+                    elif line == '\\end\\':
+                        section = 0
+                        break
+                    else:
+                        match = re.match(r'^\\(\d+)-grams:$', line)
+                        if match is None:
+                            raise ValueError('unexpected ARPA section: {}'.format(line))
+                        section = int(match.group(1))
+                        read = 0
+                    continue
+                if section == -1:
+                    match = re.match(r'^ngram\s+(\d+)\s*=\s*(\d+)$', line)
+                    if match:
+                        self.counts[int(match.group(1))] = int(match.group(2))
+                        self.n_max = max(self.n_max, int(match.group(1)))
+                        self.info += line + '\n'
+                    continue
+                if section <= 0:
+                    continue
+
+                # probability, n words, optional backoff weight
+                fields = line.split()
+                ngram = ' '.join(fields[1:section + 1])
+                log_bw = fields[section + 1] if len(fields) > section + 1 else None
+                yield section, ngram, fields[0], log_bw
+                read += 1
+                total += 1
+                if total % self.report_every == 0:
+                    self._report(section, total, t0)
+        if section > 0:
+            self._end_section(section, read, total, t0)
+
+    def _end_section(self, order, read, total, t0):
+        self._report(order, total, t0)
+        if order in self.counts and read != self.counts[order]:
+            logger.warning('{}-grams: {} n-grams read, \\data\\ announced {}'.format(order, read, self.counts[order]))
+
+    def _report(self, order, total, t0):
+        elapsed = max(time() - t0, 1e-9)
+        logger.info('{}-grams: {} n-grams read in {:.1f}s ({:.0f} n-grams/s)'.format(order, total, elapsed, total / elapsed))
 
-    # the n in ngrams up to 3
     def extract(self):
-        n = 1
-        current = 1
-        counter = 0
-        for line in self.arpa_file.readlines():
-            counter += 1            # line number starts from 1
-            line = line.strip()     # line: probability\tngrams\tbackoff_weight, ngrams:[word1 word2 word3]
-
-            if line == '' or line=='\\data\\' or line=='\\end\\':
-                continue
-            if counter >= 3 and counter <= (self.n_max + 2):
-                self.info += line + '\n'
-                continue
-            if line == "\\" + str(n) + "-grams:":
-                current = n
-                n += 1
-                continue
-
-            list = line.split('\t')
-            dict = {}
-            dict['log_p'] = list[0]
-            if len(list) == 3:     # backoff weight exist
-                dict['log_bw'] = list[2]
-            else:   # backoff weight doesn't exist (equals to 1, log10(bw)==0)
-                dict['log_bw'] = 0.0
-            self.lm[list[1]] = dict
-    
+        '''
+        load the whole model in self.lm, the lm.json layout, only for models
+        that fit in memory
+        '''
+        for order, ngram, log_p, log_bw in self.iterNgrams():
+            # backoff weight doesn't exist: equals to 1, log10(bw)==0
+            self.lm[ngram] = {'log_p': log_p, 'log_bw': log_bw if log_bw is not None else 0.0}
+
     def saveLM(self):
-        with open(self.output_path, 'w') as output_file:
-            lm = json.dumps(self.lm, ensure_ascii=False)
-            output_file.write(lm)
+        '''
+        write lm.json, entry by entry
+        '''
+        with codecs.open(self.output_path, mode='w', encoding='utf8') as output_file:
+            output_file.write('{')
+            separator = ''
+            for order, ngram, log_p, log_bw in self.iterNgrams():
+                value = {'log_p': log_p, 'log_bw': log_bw if log_bw is not None else 0.0}
+                output_file.write(separator + json.dumps(ngram, ensure_ascii=False) + ': ' + json.dumps(value))
+                separator = ', '
+            output_file.write('}')
+
+    def saveBinaryLM(self):
+        '''
+        compile the model into the binary format of src/binary_lm.py with
+        memory bounded by the vocabulary size
+        '''
+        writer = LMWriter(self.binary_output_path)
+        for order, ngram, log_p, log_bw in self.iterNgrams():
+            writer.add(ngram.split(' '), float(log_p), float(log_bw) if log_bw is not None else 0.0)
+        count = writer.finish()
+        logger.info('{} n-grams written to {}'.format(count, self.binary_output_path))
+
 
 def main():
-    parser =  ARPAParser()
-    parser.extract()
-    parser.saveLM()
+    logging.basicConfig(level=logging.INFO, format='[%(levelname)s] (%(asctime)s) (%(name)s) %(message)s')
+    parser = argparse.ArgumentParser(description='compile an ARPA language model into lm.bin')
+    parser.add_argument('lm_path', nargs='?', default='../data/lm/corpus.lm', help='ARPA file, plain or gzipped')
+    parser.add_argument('--json', action='store_true', help="also write lm.json, read by SpellChecker(lm_format='json'); a second pass over the ARPA file")
+    args = parser.parse_args()
+    arpa_parser = ARPAParser(lm_path=args.lm_path)
+    if args.json:
+        arpa_parser.saveLM()
+    arpa_parser.saveBinaryLM()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
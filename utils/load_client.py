@@ -0,0 +1,106 @@
+# !/usr/bin/python
+# -*- coding:utf-8 -*-
+# @author: Shengjia Yan
+# @date: 2026-10-18 Sunday
+# @email: i@yanshengjia.com
+
+import json
+import codecs
+import asyncio
+import argparse
+from time import perf_counter
+
+import logging
+logger = logging.getLogger('load_client')
+
+
+class LoadClient:
+    '''
+    load generator for src/server.py: 'concurrency' keep-alive connections
+    send the test set sentences to /check in a loop until 'requests' answers
+    came back, then report throughput and latency percentiles
+    '''
+    def __init__(self, host='127.0.0.1', port=8080, testset_path='../data/testset/ielts.json'):
+        self.host = host
+        self.port = port
+        self.sentences = self.loadSentences(testset_path)
+        self.latencies = []
+        self.statuses = {}
+
+    def loadSentences(self, testset_path):
+        sentences = []
+        with codecs.open(testset_path, 'r', encoding='utf8', errors='ignore') as in_file:
+            for line in in_file:
+                for sentence_dict in json.loads(line)['ERRORSENTS']:
+                    sentences.append(sentence_dict['SENT'])
+        return sentences
+
+    async def request(self, reader, writer, method, path, payload=None):
+        body = json.dumps(payload).encode('utf8') if payload is not None else b''
+        head = '{} {} HTTP/1.1\r\nHost: {}\r\nContent-Type: application/json\r\nContent-Length: {}\r\n\r\n'.format(
+            method, path, self.host, len(body))
+        writer.write(head.encode('latin-1') + body)
+        await writer.drain()
+        status = int((await reader.readline()).split()[1])
+        length = 0
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            if name.strip().lower() == 'content-length':
+                length = int(value)
+        return status, json.loads(await reader.readexactly(length))
+
+    async def worker(self, counter):
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        try:
+            while counter[0] > 0:
+                counter[0] -= 1
+                sentence = self.sentences[counter[0] % len(self.sentences)]
+                t0 = perf_counter()
+                status, _ = await self.request(reader, writer, 'POST', '/check', {'text': sentence})
+                self.latencies.append(perf_counter() - t0)
+                self.statuses[status] = self.statuses.get(status, 0) + 1
+        finally:
+            writer.close()
+
+    async def run(self, requests=2000, concurrency=64):
+        counter = [requests]
+        t0 = perf_counter()
+        await asyncio.gather(*[self.worker(counter) for _ in range(concurrency)])
+        elapsed = perf_counter() - t0
+
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        _, health = await self.request(reader, writer, 'GET', '/health')
+        writer.close()
+        return elapsed, health
+
+    def percentile(self, q):
+        latencies = sorted(self.latencies)
+        return latencies[min(int(q / 100.0 * len(latencies)), len(latencies) - 1)]
+
+    def report(self, elapsed, health):
+        logger.info('{} requests in {:.3f}s ({:.1f} requests/s), statuses: {}'.format(
+            len(self.latencies), elapsed, len(self.latencies) / elapsed, self.statuses))
+        logger.info('latency p50: {:.2f}ms, p99: {:.2f}ms, max: {:.2f}ms'.format(
+            self.percentile(50) * 1000.0, self.percentile(99) * 1000.0, max(self.latencies) * 1000.0))
+        logger.info('server: {}'.format(health))
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='[%(levelname)s] (%(asctime)s) (%(name)s) %(message)s')
+    parser = argparse.ArgumentParser(description='load generator for the spell checking service')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--testset', default='../data/testset/ielts.json')
+    args = parser.parse_args()
+
+    client = LoadClient(args.host, args.port, args.testset)
+    elapsed, health = asyncio.run(client.run(args.requests, args.concurrency))
+    client.report(elapsed, health)
+
+if __name__ == "__main__":
+    main()
@@ -4,19 +4,23 @@
 # @date: 2017-12-04 Monday
 # @email: i@yanshengjia.com
 
+import os
 import re
+import sys
 import json
 import codecs
 import random
-from collections import Counter
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+from vocabulary import load_vocabulary
 
 
 class TypoMaker:
-    def __init__(self, parent=None):
+    def __init__(self, parent=None, corpus_path='../../data/corpus/17zuoye/raw/all.txt'):
         self.parent = parent
         self.typo_size = 3
-        self.corpus_path = '../../data/corpus/17zuoye/raw/all.txt'
-        self.word_dict = Counter(self.words(open(self.corpus_path).read()))
+        self.corpus_path = corpus_path
+        self.word_dict = load_vocabulary(self.corpus_path)
         self.raw_path = '../data/testset/raw/raw_'
         self.essay_path = '../data/testset/essay/essay_'
         self.typo_path = '../data/testset/typo/typo_'
@@ -62,6 +66,51 @@ class TypoMaker:
         new_letter = random.choice(alphabet)
         return new_letter
 
+    # put a typo in about one word out of ten
+    # return the essay and its (word, typo) pairs
+    def make_essay(self, word_list):
+        word_list = list(word_list)
+        word_quantity = len(word_list)
+        typo_pairs = []
+        typo_quantity = int(word_quantity * 0.1)
+
+        for i in range(typo_quantity):
+            low = i * 10
+            high = i * 10 + 9
+            if high >= word_quantity:
+                high = word_quantity - 1
+            position = random.randint(low, high)
+            word = word_list[position]
+
+            if len(word) <= self.typo_size:
+                continue
+
+            # filter words which contain any digit
+            if any(ch.isdigit() for ch in word):
+                continue
+
+            typo = self.mistake(word)
+            word_list[position] = typo
+            typo_pairs.append((word, typo))
+
+        return " ".join(word_list), typo_pairs
+
+    # yield 'quantity' essays of at least 'min_words' words made of
+    # consecutive corpus lines, without writing anything
+    def generate_essays(self, quantity, min_words=100):
+        counter = 0
+        word_list = []
+        with codecs.open(self.corpus_path, mode='r', encoding='UTF8') as corpus_file:
+            for line in corpus_file:
+                word_list.extend(self.words(line))
+                if len(word_list) < min_words:
+                    continue
+                yield self.make_essay(word_list)
+                word_list = []
+                counter += 1
+                if counter >= quantity:
+                    break
+
     def generate_testset(self, quantity):
         counter = 0
         with codecs.open(self.corpus_path, mode='r', encoding='UTF8') as corpus_file:
@@ -80,29 +129,8 @@ class TypoMaker:
                 raw_path = self.raw_path + str(counter) + '.txt'
                 essay_path = self.essay_path + str(counter) + '.txt'
                 typo_path = self.typo_path + str(counter) + '.txt'
-                typo_str = ""
-                typo_quantity = int(word_quantity * 0.1)
-
-                for i in range(typo_quantity):
-                    low = i * 10
-                    high = i * 10 + 9
-                    if high >= word_quantity:
-                        high = word_quantity - 1
-                    position = random.randint(low, high)
-                    word = word_list[position]
-
-                    if len(word) <= self.typo_size:
-                        continue
-
-                    # filter words which contain any digit
-                    if any(ch.isdigit() for ch in word):
-                        continue
-
-                    typo = self.mistake(word)
-                    word_list[position] = typo
-                    typo_str += word + ': ' + typo + '\n'
-
-                essay = " ".join(word_list)
+                essay, typo_pairs = self.make_essay(word_list)
+                typo_str = "".join(word + ': ' + typo + '\n' for word, typo in typo_pairs)
 
                 with codecs.open(raw_path, mode='w', encoding='UTF8') as raw_file:
                     raw_file.write(raw)